@@ -1,6 +1,13 @@
 # Hopcroft-Karp maximum cardinality matching algorithm
+# Shortest augmenting path minimum-cost assignment algorithm
 
 import collections
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class Graph:
 
@@ -10,13 +17,94 @@ class Graph:
         self.u_len = u_len
         self.v_len = v_len
         self.infinity = infinity
-        self.nil = self.u_len
+        # Free vertices are paired with nil, whose level is the last one
+        # (nil must not be a valid vertex on either side)
+        self.nil = -1
         self.edges = [[] for i in range(self.u_len)]
+        self.back_edges = [[] for i in range(self.v_len)]
+        # Current matching, kept as the graph changes
+        self.pair = [self.nil] * self.u_len
+        self.back_pair = [self.nil] * self.v_len
+        self.matching = 0
+        # Whether the matching is maximum but for the vertices freed by the
+        # last change, (side, vertex) with side 0 on the left, 1 on the right
+        self.maximum = False
+        self.freed = []
 
+    # Adds an edge
+    # A maximum matching may grow by an augmenting path through the edge,
+    # from its free vertex if any (repaired later), or anywhere otherwise
+    # (the matching is no longer known to be maximum)
     def add_edge(self, u, v):
         assert u >= 0 and u < self.u_len
         assert v >= 0 and v < self.v_len
+        self.reaugment()
         self.edges[u].append(v)
+        self.back_edges[v].append(u)
+        if self.maximum:
+            self.freed = [(side, w) for side, w, pair in
+                ((0, u, self.pair), (1, v, self.back_pair))
+                if pair[w] == self.nil]
+            if len(self.freed) == 0:
+                self.maximum = False
+
+    # Adds a vertex on the left side, returns its index
+    def add_u(self):
+        self.edges.append([])
+        self.pair.append(self.nil)
+        self.u_len += 1
+        return self.u_len - 1
+
+    # Adds a vertex on the right side, returns its index
+    def add_v(self):
+        self.back_edges.append([])
+        self.back_pair.append(self.nil)
+        self.v_len += 1
+        return self.v_len - 1
+
+    # Removes an edge (one of them if there are parallel edges)
+    # Unmatches its vertices if it was in the matching
+    def remove_edge(self, u, v):
+        assert u >= 0 and u < self.u_len
+        assert v >= 0 and v < self.v_len
+        self.reaugment()
+        self.edges[u].remove(v)
+        self.back_edges[v].remove(u)
+        if self.pair[u] == v and v not in self.edges[u]:
+            self.pair[u] = self.nil
+            self.back_pair[v] = self.nil
+            self.matching -= 1
+            self.freed = [(0, u), (1, v)]
+
+    # Removes the edges of a vertex on the left side
+    # The vertex keeps its index, isolated
+    def remove_u(self, u):
+        assert u >= 0 and u < self.u_len
+        self.reaugment()
+        for v in set(self.edges[u]):
+            self.back_edges[v] = [
+                other_u for other_u in self.back_edges[v] if other_u != u]
+        self.edges[u] = []
+        if self.pair[u] != self.nil:
+            self.freed = [(1, self.pair[u])]
+            self.back_pair[self.pair[u]] = self.nil
+            self.pair[u] = self.nil
+            self.matching -= 1
+
+    # Removes the edges of a vertex on the right side
+    # The vertex keeps its index, isolated
+    def remove_v(self, v):
+        assert v >= 0 and v < self.v_len
+        self.reaugment()
+        for u in set(self.back_edges[v]):
+            self.edges[u] = [
+                other_v for other_v in self.edges[u] if other_v != v]
+        self.back_edges[v] = []
+        if self.back_pair[v] != self.nil:
+            self.freed = [(0, self.back_pair[v])]
+            self.pair[self.back_pair[v]] = self.nil
+            self.back_pair[v] = self.nil
+            self.matching -= 1
 
     def build_level(self):
         todo = collections.deque()
@@ -37,35 +125,281 @@ class Graph:
                 self.level[next_u] = self.level[u] + 1
                 todo.append(next_u)
 
+    # Matches each vertex to its first free neighbour
+    # Returns the size of the matching
+    def greedy_matching(self):
+        matching = 0
+        for u in range(self.u_len):
+            if self.pair[u] != self.nil:
+                continue
+            for v in self.edges[u]:
+                if self.back_pair[v] == self.nil:
+                    self.pair[u] = v
+                    self.back_pair[v] = u
+                    matching += 1
+                    break
+        return matching
+
+    # Searches for an augmenting path from a free vertex in the level graph
+    # DFS with an explicit stack of vertices and a current edge per vertex,
+    # an edge which does not lead to the free vertex is not scanned again
+    # until the next phase
     def augment(self, u):
-        assert u >= 0 and u <= self.u_len
+        assert u == self.nil or (u >= 0 and u < self.u_len)
         if u == self.nil:
             return True
-        else:
-            for v in self.edges[u]:
-                next_u = self.back_pair[v]
-                if self.level[next_u] != self.level[u] + 1:
-                    continue
-                if self.augment(next_u):
+        path = [u]
+        while len(path) > 0:
+            u = path[-1]
+            edges = self.edges[u]
+            i = self.current[u]
+            while i < len(edges):
+                next_u = self.back_pair[edges[i]]
+                if self.level[next_u] == self.level[u] + 1:
+                    break
+                i += 1
+            self.current[u] = i
+            if i == len(edges):
+                # Retreat from the dead end
+                self.level[u] = self.infinity
+                path.pop()
+                if len(path) > 0:
+                    self.current[path[-1]] += 1
+            elif next_u == self.nil:
+                # Flip the edges along the path
+                for u in path:
+                    v = self.edges[u][self.current[u]]
                     self.pair[u] = v
                     self.back_pair[v] = u
+                return True
+            else:
+                path.append(next_u)
+        return False
+
+    # Searches for an augmenting path from a single free vertex
+    # BFS over the alternating paths, only the vertices reached are touched
+    # Left side: edges, pair, back_pair; right side: the reverse ones
+    def augment_from(self, w, edges, pair, back_pair):
+        came = {w: None}
+        todo = collections.deque([w])
+        while len(todo) > 0:
+            u = todo.popleft()
+            for v in edges[u]:
+                next_u = back_pair[v]
+                if next_u == self.nil:
+                    # Flip the edges along the path
+                    while u is not None:
+                        previous_v = pair[u]
+                        pair[u] = v
+                        back_pair[v] = u
+                        u, v = came[u], previous_v
+                    self.matching += 1
                     return True
-            self.level[u] = self.infinity
-            return False
+                if next_u not in came:
+                    came[next_u] = u
+                    todo.append(next_u)
+        return False
+
+    # Repairs the last change to a maximum matching
+    # A single change leaves at most one augmenting path, which ends at one
+    # of the vertices it freed
+    # Changes are repaired one at a time: augmenting paths after several
+    # changes may avoid the vertices they freed
+    def reaugment(self):
+        freed, self.freed = self.freed, []
+        if not self.maximum:
+            return
+        for side, w in freed:
+            if side == 0:
+                if self.augment_from(w, self.edges, self.pair,
+                        self.back_pair):
+                    return
+            elif self.augment_from(w, self.back_edges, self.back_pair,
+                    self.pair):
+                return
 
     def max_matching(self):
         self.pair = [self.nil] * self.u_len
         self.back_pair = [self.nil] * self.v_len
-        max_matching = 0
-        while True:
+        self.maximum = False
+        self.freed = []
+        self.matching = self.greedy_matching()
+        return self.update_matching()
+
+    # Augments the current matching until it is maximum
+    # After changes to a maximum matching, the last one is repaired from
+    # the vertices it freed (the others when they were made), without
+    # touching the rest of the graph
+    # Phases over the whole graph otherwise: new matching, or edge added
+    # between matched vertices
+    def update_matching(self):
+        self.reaugment()
+        while not self.maximum:
             self.build_level()
             if self.level[self.nil] == self.infinity:
-                return max_matching
+                self.maximum = True
+                break
+            self.current = [0] * self.u_len
             for u in range(self.u_len):
                 if self.pair[u] != self.nil:
                     continue
                 if self.augment(u):
-                    max_matching += 1
+                    self.matching += 1
+        return self.matching
+
+# Minimum-cost assignment of each row of a dense cost matrix to a distinct
+# column, as many rows as columns or fewer
+# Hungarian algorithm (shortest augmenting paths with row and column
+# potentials), one row added at a time, O(n^2 m)
+# The scan of the columns from the last row reached is vectorized
+def dense_assignment_rows(cost):
+    n, m = cost.shape
+    assert n <= m
+    if numpy.issubdtype(cost.dtype, numpy.integer):
+        cost = cost.astype(numpy.int64)
+        infinity = numpy.iinfo(numpy.int64).max // 4
+    else:
+        cost = cost.astype(numpy.float64)
+        infinity = numpy.inf
+    # Column m is virtual, it is paired with the row being added
+    row_price = numpy.zeros(n, dtype=cost.dtype)
+    column_price = numpy.zeros(m + 1, dtype=cost.dtype)
+    back_pair = numpy.full(m + 1, -1, dtype=numpy.int64)
+    way = numpy.zeros(m + 1, dtype=numpy.int64)
+    for row in range(n):
+        back_pair[m] = row
+        column = m
+        min_cost = numpy.full(m + 1, infinity, dtype=cost.dtype)
+        used = numpy.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            u = back_pair[column]
+            reduced = cost[u] - row_price[u] - column_price[:m]
+            better = ~used[:m] & (reduced < min_cost[:m])
+            min_cost[:m][better] = reduced[better]
+            way[:m][better] = column
+            next_column = numpy.argmin(numpy.where(used[:m], infinity,
+                min_cost[:m]))
+            delta = min_cost[next_column]
+            row_price[back_pair[used]] += delta
+            column_price[used] -= delta
+            min_cost[:m][~used[:m]] -= delta
+            column = next_column
+            if back_pair[column] == -1:
+                break
+        # Flip the path back to the virtual column
+        while column != m:
+            previous_column = way[column]
+            back_pair[column] = back_pair[previous_column]
+            column = previous_column
+    pair = numpy.full(n, -1, dtype=numpy.int64)
+    pair[back_pair[:m][back_pair[:m] != -1]] = \
+        numpy.nonzero(back_pair[:m] != -1)[0]
+    return pair
+
+# Minimum-cost assignment with a dense cost matrix (NumPy array or list of
+# rows), rectangular or not
+# Returns the total cost and the column of each row (-1 if unassigned)
+def dense_assignment(cost):
+    if numpy is None:
+        raise ImportError('dense assignment requires numpy')
+    cost = numpy.asarray(cost)
+    assert cost.ndim == 2
+    n, m = cost.shape
+    if n <= m:
+        pair = dense_assignment_rows(cost)
+    else:
+        back_pair = dense_assignment_rows(cost.T)
+        pair = numpy.full(n, -1, dtype=numpy.int64)
+        pair[back_pair] = numpy.arange(m)
+    rows = numpy.nonzero(pair != -1)[0]
+    return cost[rows, pair[rows]].sum().item(), pair.tolist()
+
+# Minimum-cost assignment of each row to a distinct column given the
+# weighted edges (row, column, cost), as many rows as columns or fewer
+# Shortest augmenting paths with Dijkstra on the reduced costs, one row
+# added at a time, only the vertices reached are touched
+# Raises ValueError if a row cannot be assigned
+def sparse_assignment_rows(u_len, v_len, edges):
+    infinity = float('inf')
+    adjacency = [[] for u in range(u_len)]
+    for u, v, cost in edges:
+        assert u >= 0 and u < u_len
+        assert v >= 0 and v < v_len
+        adjacency[u].append((v, cost))
+    # Reduced costs (cost - row price - column price) are non-negative,
+    # and zero on the matching edges
+    row_price = [min((cost for v, cost in adjacency[u]), default=0)
+        for u in range(u_len)]
+    column_price = [0] * v_len
+    pair = [-1] * u_len
+    back_pair = [-1] * v_len
+    pair_cost = [0] * u_len
+    min_cost = [infinity] * v_len
+    previous_row = [-1] * v_len
+    previous_cost = [0] * v_len
+    for row in range(u_len):
+        reached = []
+        settled_columns = []
+        settled_rows = [(row, 0)]
+        todo = []
+        u, cost = row, 0
+        column = -1
+        while True:
+            for v, edge_cost in adjacency[u]:
+                next_cost = cost + edge_cost - row_price[u] - column_price[v]
+                if next_cost < min_cost[v]:
+                    if min_cost[v] == infinity:
+                        reached.append(v)
+                    min_cost[v] = next_cost
+                    previous_row[v] = u
+                    previous_cost[v] = edge_cost
+                    heapq.heappush(todo, (next_cost, v))
+            while len(todo) > 0:
+                cost, v = heapq.heappop(todo)
+                if cost == min_cost[v]:
+                    break
+            else:
+                break
+            settled_columns.append(v)
+            u = back_pair[v]
+            if u == -1:
+                column = v
+                break
+            settled_rows.append((u, cost))
+        if column == -1:
+            raise ValueError('no assignment of all the rows')
+        # Adjust the prices of the settled vertices
+        path_cost = min_cost[column]
+        for u, cost in settled_rows:
+            row_price[u] += path_cost - cost
+        for v in settled_columns:
+            column_price[v] -= path_cost - min_cost[v]
+        # Flip the path back to the row
+        while column != -1:
+            u = previous_row[column]
+            next_column = pair[u]
+            pair[u] = column
+            back_pair[column] = u
+            pair_cost[u] = previous_cost[column]
+            column = next_column
+        for v in reached:
+            min_cost[v] = infinity
+    return sum(pair_cost), pair
+
+# Minimum-cost assignment with weighted edges (u, v, cost) between u_len
+# rows and v_len columns, rectangular or not
+# Every vertex of the smaller side must be assigned
+# Returns the total cost and the column of each row (-1 if unassigned)
+def sparse_assignment(u_len, v_len, edges):
+    if u_len <= v_len:
+        return sparse_assignment_rows(u_len, v_len, edges)
+    total_cost, back_pair = sparse_assignment_rows(v_len, u_len,
+        [(v, u, cost) for u, v, cost in edges])
+    pair = [-1] * u_len
+    for v, u in enumerate(back_pair):
+        pair[u] = v
+    return total_cost, pair
 
 # Test for correctness
 
@@ -80,3 +414,161 @@ bipartite.add_edge(2, 0)
 
 max_matching = bipartite.max_matching()
 assert max_matching == 3
+
+# Test for correctness (long augmenting path)
+# The greedy matching leaves the last vertex free, the only augmenting path
+# goes through all the vertices
+
+n = 10000
+bipartite = Graph(n, n)
+bipartite.add_edge(0, 1)
+bipartite.add_edge(0, 0)
+for u in range(1, n - 1):
+    bipartite.add_edge(u, u + 1)
+    bipartite.add_edge(u, u)
+bipartite.add_edge(n - 1, n - 1)
+
+max_matching = bipartite.max_matching()
+assert max_matching == n
+assert sorted(bipartite.pair) == list(range(n))
+
+# Randomized tests
+
+import random
+
+def kuhn_matching(graph):
+    back_pair = [None] * graph.v_len
+    def augment(u, visited):
+        for v in graph.edges[u]:
+            if v in visited:
+                continue
+            visited.add(v)
+            if back_pair[v] is None or augment(back_pair[v], visited):
+                back_pair[v] = u
+                return True
+        return False
+    return sum(augment(u, set()) for u in range(graph.u_len))
+
+for i in range(100):
+    u_len = random.randint(1, 30)
+    v_len = random.randint(1, 30)
+    bipartite = Graph(u_len, v_len)
+    for j in range(random.randint(0, 3 * (u_len + v_len))):
+        bipartite.add_edge(random.randrange(u_len), random.randrange(v_len))
+    max_matching = bipartite.max_matching()
+    assert max_matching == kuhn_matching(bipartite)
+    matched = [u for u in range(u_len) if bipartite.pair[u] != bipartite.nil]
+    assert len(matched) == max_matching
+    for u in matched:
+        assert bipartite.pair[u] in bipartite.edges[u]
+        assert bipartite.back_pair[bipartite.pair[u]] == u
+
+# Test for correctness (assignment)
+
+cost = [
+    [4, 1, 3],
+    [2, 0, 5],
+    [3, 2, 2]]
+edges = [(u, v, cost[u][v]) for u in range(3) for v in range(3)]
+if numpy is not None:
+    assert dense_assignment(cost) == (5, [1, 0, 2])
+assert sparse_assignment(3, 3, edges) == (5, [1, 0, 2])
+
+# Rectangular, unassigned row
+if numpy is not None:
+    assert dense_assignment([[1, 5], [2, 9], [3, 4]]) == (5, [0, -1, 1])
+assert sparse_assignment(3, 2, [(0, 0, 1), (0, 1, 5), (1, 0, 2), (1, 1, 9),
+    (2, 0, 3), (2, 1, 4)]) == (5, [0, -1, 1])
+
+# Randomized tests (assignment)
+
+import itertools
+
+def brute_force_assignment(cost):
+    n, m = len(cost), len(cost[0])
+    if n <= m:
+        return min(sum(cost[u][v] for u, v in enumerate(columns))
+            for columns in itertools.permutations(range(m), n))
+    return min(sum(cost[u][v] for v, u in enumerate(rows))
+        for rows in itertools.permutations(range(n), m))
+
+for i in range(200):
+    u_len = random.randint(1, 6)
+    v_len = random.randint(1, 6)
+    cost = [[random.randint(-20, 20) for v in range(v_len)]
+        for u in range(u_len)]
+    expected = brute_force_assignment(cost)
+    if numpy is not None:
+        total_cost, pair = dense_assignment(cost)
+        assert total_cost == expected
+        assert sum(cost[u][v] for u, v in enumerate(pair) if v != -1) \
+            == expected
+        assert len(set(v for v in pair if v != -1)) == min(u_len, v_len)
+    edges = [(u, v, cost[u][v]) for u in range(u_len) for v in range(v_len)]
+    random.shuffle(edges)
+    total_cost, pair = sparse_assignment(u_len, v_len, edges)
+    assert total_cost == expected
+    assert sum(cost[u][v] for u, v in enumerate(pair) if v != -1) == expected
+
+# Sparse and dense agree, missing edges being very expensive
+n = 60
+big = 10 ** 6
+cost = [[big] * n for u in range(n)]
+edges = []
+for u in range(n):
+    for v in set(random.sample(range(n), 5) + [u]):
+        cost[u][v] = random.randint(0, 1000)
+        edges.append((u, v, cost[u][v]))
+if numpy is not None:
+    assert dense_assignment(cost)[0] == sparse_assignment(n, n, edges)[0]
+
+# Randomized tests (dynamic matching)
+
+u_len = 30
+v_len = 30
+bipartite = Graph(u_len, v_len)
+for i in range(100):
+    u, v = random.randrange(u_len), random.randrange(v_len)
+    bipartite.add_edge(u, v)
+bipartite.max_matching()
+for i in range(300):
+    change = random.randrange(6)
+    if change == 0:
+        bipartite.add_u()
+    elif change == 1:
+        bipartite.add_v()
+    elif change == 2:
+        bipartite.remove_u(random.randrange(bipartite.u_len))
+    elif change == 3:
+        bipartite.remove_v(random.randrange(bipartite.v_len))
+    elif change == 4:
+        u = random.randrange(bipartite.u_len)
+        if len(bipartite.edges[u]) > 0:
+            bipartite.remove_edge(u, random.choice(bipartite.edges[u]))
+    for j in range(random.randint(0, 3)):
+        bipartite.add_edge(random.randrange(bipartite.u_len),
+            random.randrange(bipartite.v_len))
+    max_matching = bipartite.update_matching()
+    for u, v in enumerate(bipartite.pair):
+        if v != bipartite.nil:
+            assert v in bipartite.edges[u]
+            assert bipartite.back_pair[v] == u
+    assert max_matching == kuhn_matching(bipartite)
+
+# Test for correctness (dynamic matching)
+# Each change is repaired from the vertices it freed, without phases over
+# the whole graph
+
+bipartite = Graph(3, 3)
+for u, v in ((1, 2), (1, 0), (1, 1), (2, 0)):
+    bipartite.add_edge(u, v)
+assert bipartite.max_matching() == 2
+assert bipartite.pair == [bipartite.nil, 2, 0]
+bipartite.add_edge(0, 0)
+bipartite.remove_edge(1, 2)
+bipartite.remove_edge(2, 0)
+assert bipartite.maximum
+assert bipartite.update_matching() == 2
+assert bipartite.maximum
+assert bipartite.pair == [0, 1, bipartite.nil]
+
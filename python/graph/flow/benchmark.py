@@ -0,0 +1,203 @@
+from graph import *
+from max_flow import edmonds_karp, dinitz
+from min_cost_max_flow import ssp_naive, ssp
+from stats import SolverStats
+
+import json
+import platform
+import random
+import time
+
+# Instance generators
+# Each returns a graph, a source and a sink, and is reproducible given a seed
+
+# Random edges, source 0 and sink V - 1
+def random_instance(vertices_count, edges_count, seed,
+        max_capacity=1000, max_cost=1000):
+    rng = random.Random(seed)
+    graph = Graph(vertices_count)
+    for i in range(edges_count):
+        tail = rng.randrange(vertices_count)
+        head = rng.randrange(vertices_count)
+        graph.add_edge(tail, head,
+            capacity=rng.randint(1, max_capacity),
+            cost=rng.randint(0, max_cost))
+    return graph, 0, vertices_count - 1
+
+# Grid with edges to the 4 neighbours, source linked to the first column
+# and the last column linked to sink
+def grid_instance(rows, columns, seed, max_capacity=1000, max_cost=1000):
+    rng = random.Random(seed)
+    vertex = lambda row, column: row * columns + column
+    source = rows * columns
+    sink = source + 1
+    graph = Graph(rows * columns + 2)
+    for row in range(rows):
+        graph.add_edge(source, vertex(row, 0), capacity=infinity)
+        graph.add_edge(vertex(row, columns - 1), sink, capacity=infinity)
+        for column in range(columns):
+            for other_row, other_column in ((row + 1, column),
+                    (row - 1, column), (row, column + 1), (row, column - 1)):
+                if 0 <= other_row < rows and 0 <= other_column < columns:
+                    graph.add_edge(vertex(row, column),
+                        vertex(other_row, other_column),
+                        capacity=rng.randint(1, max_capacity),
+                        cost=rng.randint(0, max_cost))
+    return graph, source, sink
+
+# Layers of vertices, each vertex linked to a few vertices of the next layer,
+# in the spirit of the AK generator: many long shortest paths of equal
+# length and small capacities deep inside
+def layered_instance(layers, width, seed, degree=3,
+        max_capacity=1000, max_cost=1000):
+    rng = random.Random(seed)
+    vertex = lambda layer, i: 2 + layer * width + i
+    source, sink = 0, 1
+    graph = Graph(2 + layers * width)
+    for i in range(width):
+        graph.add_edge(source, vertex(0, i), capacity=max_capacity)
+        graph.add_edge(vertex(layers - 1, i), sink, capacity=max_capacity)
+    for layer in range(layers - 1):
+        for i in range(width):
+            for j in rng.sample(range(width), min(degree, width)):
+                graph.add_edge(vertex(layer, i), vertex(layer + 1, j),
+                    capacity=rng.randint(1, max_capacity),
+                    cost=rng.randint(0, max_cost))
+    return graph, source, sink
+
+# Assignment problem as a flow, unit capacities, random costs between
+# each worker and a few jobs
+def assignment_instance(size, seed, degree=5, max_cost=1000):
+    rng = random.Random(seed)
+    source, sink = 2 * size, 2 * size + 1
+    graph = Graph(2 * size + 2)
+    for i in range(size):
+        graph.add_edge(source, i)
+        graph.add_edge(size + i, sink)
+        for j in rng.sample(range(size), min(degree, size)):
+            graph.add_edge(i, size + j, cost=rng.randint(0, max_cost))
+    return graph, source, sink
+
+# Long path with an exit to sink at each vertex, shortest augmenting paths
+# get longer and longer, O(V^2) edge scans for augmenting path algorithms
+def long_path_instance(length, seed, max_cost=1000):
+    rng = random.Random(seed)
+    source, sink = length, length + 1
+    graph = Graph(length + 2)
+    graph.add_edge(source, 0, capacity=length)
+    for i in range(length):
+        if i + 1 < length:
+            graph.add_edge(i, i + 1, capacity=length,
+                cost=rng.randint(0, max_cost))
+        graph.add_edge(i, sink, capacity=1, cost=rng.randint(0, max_cost))
+    return graph, source, sink
+
+# Instances by increasing size
+instances = {
+    'random': [
+        lambda seed, n=n: random_instance(n, 10 * n, seed)
+        for n in (100, 300, 1000)],
+    'grid': [
+        lambda seed, n=n: grid_instance(n, n, seed)
+        for n in (10, 15, 20)],
+    'layered': [
+        lambda seed, n=n: layered_instance(n, n, seed)
+        for n in (10, 15, 20)],
+    'assignment': [
+        lambda seed, n=n: assignment_instance(n, seed)
+        for n in (50, 100, 200)],
+    'long_path': [
+        lambda seed, n=n: long_path_instance(n, seed)
+        for n in (100, 200, 400)],
+}
+
+max_flow_solvers = {'edmonds_karp': edmonds_karp, 'dinitz': dinitz}
+min_cost_solvers = {'ssp_naive': ssp_naive, 'ssp': ssp}
+
+# Times every solver on every instance
+# Returns one record per run, with the wall time and the solver counters
+def run(seed=0, names=None, solvers=None):
+    results = []
+    all_solvers = dict(max_flow_solvers, **min_cost_solvers)
+    for name, generators in instances.items():
+        if names is not None and name not in names:
+            continue
+        for size, generator in enumerate(generators):
+            graph, source, sink = generator(seed)
+            for solver_name, solver in all_solvers.items():
+                if solvers is not None and solver_name not in solvers:
+                    continue
+                stats = SolverStats()
+                start = time.perf_counter()
+                value = solver(graph, source, sink, stats=stats)
+                seconds = time.perf_counter() - start
+                if isinstance(value, tuple):
+                    value = list(value)
+                results.append({
+                    'instance': name,
+                    'size': size,
+                    'seed': seed,
+                    'vertices': graph.vertices_count,
+                    'edges': len(graph.head) // 2,
+                    'solver': solver_name,
+                    'seconds': seconds,
+                    'value': value,
+                    'augmentations': stats.counters['augmentations'],
+                    'edge_scans': stats.counters['edge_scans'],
+                    'phases': stats.counters['phases'],
+                    'stats': stats.to_dict(),
+                })
+    return results
+
+# Compares two runs, returns the records at least threshold times slower
+# or whose value changed
+def compare(baseline, results, threshold=1.5):
+    key = lambda record: (record['instance'], record['size'],
+        record['seed'], record['solver'])
+    baseline = dict((key(record), record) for record in baseline)
+    regressions = []
+    for record in results:
+        old = baseline.get(key(record))
+        if old is None:
+            continue
+        if old['value'] != record['value'] \
+                or record['seconds'] > threshold * old['seconds']:
+            regressions.append((old, record))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Flow algorithms benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--instances', nargs='*', choices=list(instances))
+    parser.add_argument('--solvers', nargs='*',
+        choices=list(max_flow_solvers) + list(min_cost_solvers))
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('--baseline', help='JSON results file to compare to')
+    parser.add_argument('--threshold', type=float, default=1.5)
+    args = parser.parse_args()
+
+    results = run(args.seed, args.instances, args.solvers)
+    for record in results:
+        print('{instance:>10} {size} {vertices:>6} {edges:>7} {solver:>12}'
+            ' {seconds:9.4f}s {phases:>6} {augmentations:>8} {edge_scans:>10}'.format(
+                **record))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'results': results,
+            }, f, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(baseline, results, args.threshold)
+        for old, new in regressions:
+            print('regression {instance} {size} {solver}:'.format(**new),
+                '{:.4f}s -> {:.4f}s'.format(old['seconds'], new['seconds']),
+                '' if old['value'] == new['value'] else 'value changed')
+        if len(regressions) > 0:
+            raise SystemExit(1)
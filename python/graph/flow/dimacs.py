@@ -0,0 +1,209 @@
+from graph import *
+
+import array
+
+# DIMACS network files, vertices are numbered from 1
+# Maximum flow: p max V E, n v s, n v t, a u v capacity
+# Minimum-cost flow: p min V E, n v supply, a u v lower capacity cost
+# with a single vertex of positive supply (source) and a single vertex of
+# negative supply (sink), and no lower bounds
+
+# Reads a DIMACS maximum flow or minimum-cost flow problem
+# Streams the lines into typed arrays, then builds a CSR graph
+# Returns the graph, the source, the sink and the supply of the source
+# (None for a maximum flow problem), the flow to send from source to sink
+# Raises ValueError for several vertices of positive or negative supply
+def read_dimacs(lines):
+    vertices_count = None
+    source = sink = supply = demand = None
+    tails = array.array('q')
+    heads = array.array('q')
+    capacities = array.array('q')
+    costs = array.array('q')
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 0 or fields[0] == 'c':
+            continue
+        if fields[0] == 'a':
+            tails.append(int(fields[1]) - 1)
+            heads.append(int(fields[2]) - 1)
+            if len(fields) == 4:
+                capacities.append(int(fields[3]))
+            else:
+                if int(fields[3]) != 0:
+                    raise ValueError('lower bounds are not supported')
+                capacities.append(int(fields[4]))
+                costs.append(int(fields[5]))
+        elif fields[0] == 'n':
+            vertex = int(fields[1]) - 1
+            if fields[2] == 's':
+                source = vertex
+            elif fields[2] == 't':
+                sink = vertex
+            elif int(fields[2]) > 0:
+                if source is not None:
+                    raise ValueError('several vertices of positive supply')
+                source, supply = vertex, int(fields[2])
+            elif int(fields[2]) < 0:
+                if sink is not None:
+                    raise ValueError('several vertices of negative supply')
+                sink, demand = vertex, -int(fields[2])
+        elif fields[0] == 'p':
+            if fields[1] not in ('max', 'min'):
+                raise ValueError('unsupported problem: ' + fields[1])
+            vertices_count = int(fields[2])
+        else:
+            raise ValueError('unexpected line: ' + line)
+    if vertices_count is None or source is None or sink is None:
+        raise ValueError('missing problem, source or sink line')
+    if supply != demand:
+        raise ValueError('supply and demand differ')
+    graph = CsrGraph.from_edges(vertices_count, tails, heads, capacities,
+        costs if len(costs) > 0 else None)
+    return graph, source, sink, supply
+
+# Writes a DIMACS maximum flow (no costs) or minimum-cost flow problem
+# (supply of the source), the reverse of read_dimacs
+# Edges are written in the order in which they were given
+def write_dimacs(f, graph, source, sink, supply=None):
+    tail, head = graph.tail, graph.head
+    capacity, cost = graph.capacity, graph.cost
+    edge_index = graph.edge_index
+    if supply is None:
+        f.write('p max {} {}\n'.format(graph.vertices_count, len(edge_index)))
+        f.write('n {} s\n'.format(source + 1))
+        f.write('n {} t\n'.format(sink + 1))
+        for edge in edge_index:
+            f.write('a {} {} {}\n'.format(
+                tail[edge] + 1, head[edge] + 1, capacity[edge]))
+    else:
+        f.write('p min {} {}\n'.format(graph.vertices_count, len(edge_index)))
+        f.write('n {} {}\n'.format(source + 1, supply))
+        f.write('n {} {}\n'.format(sink + 1, -supply))
+        for edge in edge_index:
+            f.write('a {} {} 0 {} {}\n'.format(
+                tail[edge] + 1, head[edge] + 1, capacity[edge], cost[edge]))
+
+# Writes a DIMACS solution, the value (flow or cost) and the flow of each
+# edge in the order in which they were given
+def write_dimacs_flow(f, graph, value):
+    tail, head, flow = graph.tail, graph.head, graph.flow
+    f.write('s {}\n'.format(value))
+    for edge in graph.edge_index:
+        f.write('f {} {} {}\n'.format(tail[edge] + 1, head[edge] + 1, flow[edge]))
+
+# Reads a DIMACS solution into the flow of a graph
+# Returns the value
+# Raises ValueError if the arcs are not those of the graph
+def read_dimacs_flow(lines, graph):
+    graph.reset_flow()
+    edge_index = iter(graph.edge_index)
+    value = None
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 0 or fields[0] == 'c':
+            continue
+        if fields[0] == 's':
+            value = int(fields[1])
+        elif fields[0] == 'f':
+            edge = next(edge_index, None)
+            if edge is None or graph.tail[edge] != int(fields[1]) - 1 \
+                    or graph.head[edge] != int(fields[2]) - 1:
+                raise ValueError('flow file for another graph')
+            flow = int(fields[3])
+            if flow > 0:
+                graph.increase_flow(edge, flow)
+    return value
+
+
+if __name__ == "__main__":
+
+    from max_flow import dinitz
+    from min_cost_max_flow import ssp
+
+    import io
+
+    ### Tests for correctness ###
+
+    problem = """c Example
+p max 6 9
+n 1 s
+n 6 t
+a 1 2 10
+a 1 3 10
+a 2 3 2
+a 2 4 4
+a 2 5 8
+a 3 5 9
+a 4 6 10
+a 5 4 6
+a 5 6 10
+"""
+    g, source, sink, supply = read_dimacs(io.StringIO(problem))
+    assert (source, sink, supply) == (0, 5, None)
+    max_flow = dinitz(g, source, sink)
+    assert max_flow == 19
+
+    f = io.StringIO()
+    write_dimacs(f, g, source, sink)
+    assert f.getvalue() == problem[problem.index('p max'):]
+
+    f = io.StringIO()
+    write_dimacs_flow(f, g, max_flow)
+    flows = [g.flow[edge] for edge in g.edge_index]
+    h, source, sink, supply = read_dimacs(io.StringIO(problem))
+    assert read_dimacs_flow(io.StringIO(f.getvalue()), h) == max_flow
+    assert [h.flow[edge] for edge in h.edge_index] == flows
+
+    # Arcs of another graph
+    for solution in ("s 1\nf 2 1 1\n", f.getvalue() + "f 1 2 0\n"):
+        try:
+            read_dimacs_flow(io.StringIO(solution), h)
+            assert False
+        except ValueError:
+            pass
+
+    ### Tests for correctness (minimum-cost flow) ###
+
+    problem = """p min 3 2
+n 1 1
+n 3 -1
+a 1 2 0 5 1
+a 2 3 0 5 1
+"""
+    g, source, sink, supply = read_dimacs(io.StringIO(problem))
+    assert (source, sink, supply) == (0, 2, 1)
+    f = io.StringIO()
+    write_dimacs(f, g, source, sink, supply)
+    assert f.getvalue() == problem
+
+    for lines in (["p min 3 0", "n 1 1", "n 2 1", "n 3 -2"],
+            ["p min 3 0", "n 1 2", "n 2 -1", "n 3 -1"],
+            ["p min 3 0", "n 1 2", "n 3 -1"]):
+        try:
+            read_dimacs(lines)
+            assert False
+        except ValueError:
+            pass
+
+    ### Randomized tests (minimum-cost flow round trip) ###
+
+    import random
+
+    vertices_count = 50
+    edges_count = 500
+
+    g = Graph(vertices_count)
+    for i in range(edges_count):
+        tail = random.randrange(vertices_count - 1)
+        head = random.randrange(tail + 1, vertices_count)
+        g.add_edge(tail, head, capacity=random.randint(1, 1000),
+            cost=random.randint(-1000, 1000))
+    min_cost, max_flow = ssp(g, 0, vertices_count - 1)
+
+    f = io.StringIO()
+    write_dimacs(f, g, 0, vertices_count - 1, supply=max_flow)
+    f.seek(0)
+    h, source, sink, supply = read_dimacs(f)
+    assert (source, sink, supply) == (0, vertices_count - 1, max_flow)
+    assert ssp(h, source, sink) == (min_cost, max_flow)
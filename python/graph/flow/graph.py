@@ -1,61 +1,205 @@
+import array
+
 infinity = int(1e18)
 
-class Edge:
+# Residual graph
+# Edges are identified by their index in parallel arrays (head, tail,
+# capacity, cost, flow, reverse), an edge and its reverse are always
+# created together, edges[vertex] lists the edges leaving vertex
+# The version changes with every change to the edges, capacities or flow
+class ResidualGraph:
 
-    def __init__(self, tail, head, capacity, cost):
-        assert capacity >= 0
-        self.tail = tail
-        self.head = head
-        self.capacity = capacity
-        self.cost = cost
-        self.flow = 0
+    # Capacity changes keep the flow, the flow of an edge whose capacity
+    # drops below it is cut, and the tail and head of the edge are recorded
+    # as unbalanced until a solver repairs the flow
+    def increase_capacity(self, edge, delta):
+        assert delta >= 0
+        self.capacity[edge] += delta
+        self.version += 1
+
+    def decrease_capacity(self, edge, delta):
+        assert delta >= 0 and delta <= self.capacity[edge]
+        self.capacity[edge] -= delta
+        self.version += 1
+        cut = self.flow[edge] - self.capacity[edge]
+        if cut > 0:
+            self.flow[edge] -= cut
+            self.flow[self.reverse[edge]] += cut
+            self.unbalanced.add(self.tail[edge])
+            self.unbalanced.add(self.head[edge])
 
-    def increase_flow(self, flow):
+    def increase_flow(self, edge, flow):
         assert flow > 0
-        self.flow += flow
-        self.reverse.flow -= flow
+        self.flow[edge] += flow
+        self.flow[self.reverse[edge]] -= flow
+        self.version += 1
 
-class Graph:
+    def reset_flow(self):
+        for edge in range(len(self.flow)):
+            self.flow[edge] = 0
+        self.unbalanced.clear()
+        self.version += 1
+
+# Growable residual graph, one add_edge call per edge
+class Graph(ResidualGraph):
 
     def __init__(self, vertices_count):
         self.vertices_count = vertices_count
         self.edges = [[] for _ in range(self.vertices_count)]
+        self.tail = []
+        self.head = []
+        self.capacity = []
+        self.cost = []
+        self.flow = []
+        self.reverse = []
+        self.unbalanced = set()
+        self.version = 0
 
+    # Returns the forward edge, the backward edge is the next index
     def add_edge(self, tail, head, capacity=1, cost=0):
         assert tail >= 0 and tail < self.vertices_count
         assert head >= 0 and head < self.vertices_count
-        forward = Edge(tail, head, capacity, cost)
-        backward = Edge(head, tail, 0, -cost)
-        forward.reverse = backward
-        backward.reverse = forward
+        assert capacity >= 0
+        forward = len(self.head)
+        backward = forward + 1
+        self.tail += (tail, head)
+        self.head += (head, tail)
+        self.capacity += (capacity, 0)
+        self.cost += (cost, -cost)
+        self.flow += (0, 0)
+        self.reverse += (backward, forward)
         self.edges[tail].append(forward)
         self.edges[head].append(backward)
+        self.version += 1
+        return forward
 
-    def reset_flow(self):
-        for vertex in range(self.vertices_count):
-            for edge in self.edges[vertex]:
-                edge.flow = 0
+    # Forward edge of each add_edge call, in order
+    @property
+    def edge_index(self):
+        return range(0, len(self.head), 2)
+
+# Edges leaving each vertex of a CSR graph, as ranges of indices
+class CsrEdges:
+
+    def __init__(self, first):
+        self.first = first
+
+    def __len__(self):
+        return len(self.first) - 1
+
+    def __getitem__(self, vertex):
+        return range(self.first[vertex], self.first[vertex + 1])
+
+# Frozen residual graph in compressed sparse row layout
+# Edges are sorted by tail, the edges leaving a vertex are contiguous
+# Edge attributes are typed arrays, edge_index maps the i-th input edge
+# to its forward edge
+class CsrGraph(ResidualGraph):
+
+    def __init__(self, vertices_count, first, tail, head, capacity, cost,
+            reverse, edge_index, flow=None):
+        assert len(first) == vertices_count + 1
+        self.vertices_count = vertices_count
+        self.first = first
+        self.tail = tail
+        self.head = head
+        self.capacity = capacity
+        self.cost = cost
+        self.reverse = reverse
+        self.edge_index = edge_index
+        if flow is None:
+            flow = array.array('q', bytes(8 * len(head)))
+        self.flow = flow
+        self.edges = CsrEdges(first)
+        self.unbalanced = set()
+        self.version = 0
+
+    # Creates a CSR graph from parallel arrays of edges
+    # Counting sort on the tails, O(V + E)
+    @staticmethod
+    def from_edges(vertices_count, tails, heads, capacities=None, costs=None):
+        edges_count = len(tails)
+        assert len(heads) == edges_count
+        assert capacities is None or len(capacities) == edges_count
+        assert costs is None or len(costs) == edges_count
+        # Count the edges leaving each vertex, forward and backward
+        first = array.array('q', bytes(8 * (vertices_count + 1)))
+        for i in range(edges_count):
+            tail, head = tails[i], heads[i]
+            assert tail >= 0 and tail < vertices_count
+            assert head >= 0 and head < vertices_count
+            first[tail + 1] += 1
+            first[head + 1] += 1
+        for vertex in range(vertices_count):
+            first[vertex + 1] += first[vertex]
+        # Place each edge and its reverse
+        size = 8 * 2 * edges_count
+        tail = array.array('q', bytes(size))
+        head = array.array('q', bytes(size))
+        capacity = array.array('q', bytes(size))
+        cost = array.array('q', bytes(size))
+        reverse = array.array('q', bytes(size))
+        edge_index = array.array('q', bytes(8 * edges_count))
+        position = first[:-1]
+        for i in range(edges_count):
+            u, v = tails[i], heads[i]
+            forward = position[u]
+            position[u] += 1
+            backward = position[v]
+            position[v] += 1
+            tail[forward], head[forward] = u, v
+            tail[backward], head[backward] = v, u
+            capacity[forward] = 1 if capacities is None else capacities[i]
+            assert capacity[forward] >= 0
+            if costs is not None:
+                cost[forward] = costs[i]
+                cost[backward] = -costs[i]
+            reverse[forward] = backward
+            reverse[backward] = forward
+            edge_index[i] = forward
+        return CsrGraph(vertices_count, first, tail, head, capacity, cost,
+            reverse, edge_index)
+
+    # Freezes a graph, edges keep their add_edge order
+    @staticmethod
+    def from_graph(graph):
+        return CsrGraph.from_edges(graph.vertices_count,
+            graph.tail[0::2], graph.head[0::2],
+            graph.capacity[0::2], graph.cost[0::2])
+
+# Net flow leaving a vertex
+def outflow(graph, vertex):
+    flow = graph.flow
+    return sum(flow[edge] for edge in graph.edges[vertex])
+
+# Total cost of the flow
+def flow_cost(graph):
+    flow, cost = graph.flow, graph.cost
+    return sum(flow[edge] * cost[edge]
+        for edge in range(len(flow))
+        if flow[edge] > 0)
 
 # Finds the list of edges from source to sink
 # given the parent-link representation of a tree
-def find_path(previous_edge, source, sink):
+def find_path(graph, previous_edge, source, sink):
     vertex = sink
     path = []
     while vertex != source:
         edge = previous_edge[vertex]
         path.append(edge)
-        vertex = edge.tail
+        vertex = graph.tail[edge]
     return list(reversed(path))
 
 # Saturates the flow on a path
 # Returns the increase in cost and flow
-def saturate_flow(path):
+def saturate_flow(graph, path):
+    capacity, flow = graph.capacity, graph.flow
     cost = 0
-    flow = min(edge.capacity - edge.flow for edge in path)
-    if flow == 0:
+    path_flow = min(capacity[edge] - flow[edge] for edge in path)
+    if path_flow == 0:
         return 0, 0
     for edge in path:
-        cost += edge.cost
-        edge.increase_flow(flow)
-    cost *= flow
-    return cost, flow
+        cost += graph.cost[edge]
+        graph.increase_flow(edge, path_flow)
+    cost *= path_flow
+    return cost, path_flow
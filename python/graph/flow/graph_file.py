@@ -0,0 +1,121 @@
+from graph import *
+
+import array
+import mmap
+
+# Binary CSR graph files
+# Header: magic, vertices count, edges count (given edges, not reverses)
+# then the CSR arrays as signed 64-bit integers in native byte order:
+# first (V + 1), tail, head, capacity, cost, reverse (2E each), edge index (E)
+graph_magic = b'FLOWCSR1'
+
+# Binary flow files
+# Header: magic, edges count, then the flow of each given edge
+flow_magic = b'FLOWVAL1'
+
+def graph_arrays(graph):
+    return (graph.first, graph.tail, graph.head, graph.capacity, graph.cost,
+        graph.reverse, graph.edge_index)
+
+# Writes a graph, converted to the CSR layout if needed
+def save_graph(path, graph):
+    if not isinstance(graph, CsrGraph):
+        graph = CsrGraph.from_graph(graph)
+    with open(path, 'wb') as f:
+        f.write(graph_magic)
+        array.array('q', [graph.vertices_count, len(graph.edge_index)]).tofile(f)
+        for values in graph_arrays(graph):
+            f.write(memoryview(values).cast('B'))
+
+# Maps a graph file into memory, no copy and no per-edge work
+# The mapping is copy-on-write: processes mapping the same file share its
+# pages, and capacity changes stay private to the process
+# The flow starts at 0 in a new array
+def load_graph(path):
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if mapping[:len(graph_magic)] != graph_magic:
+        raise ValueError('not a graph file')
+    values = memoryview(mapping)[len(graph_magic):].cast('q')
+    vertices_count, edges_count = values[0], values[1]
+    sizes = [vertices_count + 1] + [2 * edges_count] * 5 + [edges_count]
+    if len(values) != 2 + sum(sizes):
+        raise ValueError('truncated graph file')
+    arrays = []
+    offset = 2
+    for size in sizes:
+        arrays.append(values[offset:offset + size])
+        offset += size
+    return CsrGraph(vertices_count, *arrays)
+
+# Writes the flow of each given edge
+def save_flow(path, graph):
+    flow = array.array('q', (graph.flow[edge] for edge in graph.edge_index))
+    with open(path, 'wb') as f:
+        f.write(flow_magic)
+        array.array('q', [len(flow)]).tofile(f)
+        flow.tofile(f)
+
+# Reads the flow of each given edge into a graph
+def load_flow(path, graph):
+    with open(path, 'rb') as f:
+        if f.read(len(flow_magic)) != flow_magic:
+            raise ValueError('not a flow file')
+        edges_count = array.array('q')
+        edges_count.fromfile(f, 1)
+        if edges_count[0] != len(graph.edge_index):
+            raise ValueError('flow file for another graph')
+        flow = array.array('q')
+        flow.fromfile(f, edges_count[0])
+    graph.reset_flow()
+    for edge, edge_flow in zip(graph.edge_index, flow):
+        graph.flow[edge] = edge_flow
+        graph.flow[graph.reverse[edge]] = -edge_flow
+
+
+if __name__ == "__main__":
+
+    from max_flow import dinitz
+    from min_cost_max_flow import ssp
+
+    import os
+    import tempfile
+
+    ### Randomized tests (round trip) ###
+
+    import random
+
+    vertices_count = 50
+    edges_count = 500
+
+    g = Graph(vertices_count)
+    for i in range(edges_count):
+        tail = random.randrange(vertices_count - 1)
+        head = random.randrange(tail + 1, vertices_count)
+        g.add_edge(tail, head, capacity=random.randint(1, 1000),
+            cost=random.randint(-1000, 1000))
+    source = 0
+    sink = vertices_count - 1
+    min_cost, max_flow = ssp(g, source, sink)
+
+    with tempfile.TemporaryDirectory() as directory:
+        graph_path = os.path.join(directory, 'graph.bin')
+        flow_path = os.path.join(directory, 'flow.bin')
+
+        save_graph(graph_path, g)
+        h = load_graph(graph_path)
+        assert h.vertices_count == vertices_count
+        assert [h.tail[edge] for edge in h.edge_index] == g.tail[0::2]
+        assert [h.head[edge] for edge in h.edge_index] == g.head[0::2]
+        assert dinitz(h, source, sink) == max_flow
+        assert ssp(h, source, sink) == (min_cost, max_flow)
+
+        # Capacity changes do not reach the file
+        h.decrease_capacity(h.edge_index[0], h.capacity[h.edge_index[0]])
+        assert load_graph(graph_path).capacity[h.edge_index[0]] == g.capacity[0]
+
+        save_flow(flow_path, g)
+        h = load_graph(graph_path)
+        load_flow(flow_path, h)
+        assert [h.flow[edge] for edge in h.edge_index] == g.flow[0::2]
+        assert flow_cost(h) == min_cost
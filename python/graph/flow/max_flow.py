@@ -4,118 +4,355 @@ import collections
 
 # Finds a shortest path in the residual graph
 # BFS algorithm
-def edmonds_karp_bfs(graph, source, sink):
+def edmonds_karp_bfs(graph, source, sink, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= 0 and sink < graph.vertices_count
     level = [infinity] * graph.vertices_count
     level[source] = 0
     previous_edge = [None] * graph.vertices_count
+    capacity, flow, head = graph.capacity, graph.flow, graph.head
     todo = collections.deque()
     todo.append(source)
     while len(todo) > 0:
         vertex = todo.popleft()
         next_level = level[vertex] + 1
+        if stats is not None:
+            stats.count('edge_scans', len(graph.edges[vertex]))
         edges = (edge
             for edge in graph.edges[vertex]
-            if edge.capacity > edge.flow)
+            if capacity[edge] > flow[edge])
         for edge in edges:
-            next_vertex = edge.head
+            next_vertex = head[edge]
             if level[next_vertex] == infinity:
                 level[next_vertex] = next_level
                 previous_edge[next_vertex] = edge
                 if next_vertex == sink:
-                    return find_path(previous_edge, source, sink)
+                    return find_path(graph, previous_edge, source, sink)
                 todo.append(next_vertex)
 
+# Finds a shortest path in the residual graph from any root to any target
+# BFS algorithm
+# Only visits the vertices closer than the nearest target
+def residual_bfs(graph, roots, is_target):
+    capacity, flow, head = graph.capacity, graph.flow, graph.head
+    previous_edge = {}
+    todo = collections.deque()
+    for root in roots:
+        previous_edge[root] = None
+        todo.append(root)
+    while len(todo) > 0:
+        vertex = todo.popleft()
+        edges = (edge
+            for edge in graph.edges[vertex]
+            if capacity[edge] > flow[edge])
+        for edge in edges:
+            next_vertex = head[edge]
+            if next_vertex not in previous_edge:
+                previous_edge[next_vertex] = edge
+                if is_target(next_vertex):
+                    path = []
+                    while previous_edge[next_vertex] is not None:
+                        path.append(previous_edge[next_vertex])
+                        next_vertex = graph.tail[path[-1]]
+                    return list(reversed(path))
+                todo.append(next_vertex)
+
+# Restores flow conservation after capacity decreases
+# Routes the excess of each unbalanced vertex to a vertex lacking flow or
+# back to source, then brings the missing flow back from sink or source
+def repair_flow(graph, source, sink):
+    assert source >= 0 and source < graph.vertices_count
+    assert sink >= 0 and sink < graph.vertices_count
+    excess = dict((vertex, -outflow(graph, vertex))
+        for vertex in graph.unbalanced
+        if vertex != source and vertex != sink)
+    graph.unbalanced.clear()
+    capacity, flow = graph.capacity, graph.flow
+    def augment(path, amount):
+        amount = min([amount] + [capacity[edge] - flow[edge] for edge in path])
+        for edge in path:
+            graph.increase_flow(edge, amount)
+        return amount
+    for vertex in excess:
+        while excess[vertex] > 0:
+            is_target = lambda other: (other == source
+                or excess.get(other, 0) < 0)
+            path = residual_bfs(graph, [vertex], is_target)
+            assert path is not None
+            other = graph.head[path[-1]]
+            amount = excess[vertex]
+            if other != source:
+                amount = min(amount, -excess[other])
+            amount = augment(path, amount)
+            excess[vertex] -= amount
+            if other != source:
+                excess[other] += amount
+    for vertex in excess:
+        while excess[vertex] < 0:
+            path = residual_bfs(graph, [sink, source],
+                lambda other: other == vertex)
+            assert path is not None
+            excess[vertex] += augment(path, -excess[vertex])
+
+# Prepares the flow for a solver
+# Either repairs the current flow and returns its value, or clears it
+def initial_flow(graph, source, sink, resume):
+    if resume:
+        repair_flow(graph, source, sink)
+        return outflow(graph, source)
+    graph.reset_flow()
+    return 0
+
 # Finds a maximum flow
 # Edmonds-Karp algorithm
 # Repeatedly saturates a shortest path in the residual graph
-def edmonds_karp(graph, source, sink):
+def edmonds_karp(graph, source, sink, resume=False, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= 0 and sink < graph.vertices_count
-    graph.reset_flow()
-    total_flow = 0
+    total_flow = initial_flow(graph, source, sink, resume)
     while True:
+        if stats is not None:
+            start = stats.clock()
         # Search for a shortest path
-        path = edmonds_karp_bfs(graph, source, sink)
+        path = edmonds_karp_bfs(graph, source, sink, stats)
         if path is None:
             return total_flow
         # Saturate the shortest path
-        cost, flow = saturate_flow(path)
+        cost, flow = saturate_flow(graph, path)
         total_flow += flow
+        if stats is not None:
+            stats.count('augmentations')
+            stats.phase('edmonds_karp', start)
 
 # Assigns a level to each vertex on a shortest path from source to sink
 # in the residual graph
 # BFS algorithm
 # Proceeds from sink to source to limit the dead-ends during the DFS
-def dinitz_bfs(graph, source, sink):
+def dinitz_bfs(graph, source, sink, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= 0 and sink < graph.vertices_count
     level = [infinity] * graph.vertices_count
     level[sink] = 0
+    capacity, flow, head = graph.capacity, graph.flow, graph.head
+    reverse = graph.reverse
     todo = collections.deque()
     todo.append(sink)
     while len(todo) > 0:
         vertex = todo.popleft()
         next_level = level[vertex] + 1
+        if stats is not None:
+            stats.count('edge_scans', len(graph.edges[vertex]))
         edges = (edge
             for edge in graph.edges[vertex]
-            if edge.reverse.capacity > edge.reverse.flow)
+            if capacity[reverse[edge]] > flow[reverse[edge]])
         for edge in edges:
-            next_vertex = edge.head
+            next_vertex = head[edge]
             if level[next_vertex] == infinity:
                 level[next_vertex] = next_level
                 if next_vertex == source:
                     return level
                 todo.append(next_vertex)
 
-# Finds a path from source to sink in a level graph
-# DFS algorithm
-def dinitz_dfs(graph, level, source, sink):
+# Saturates a blocking flow in a level graph
+# DFS algorithm with current-edge pointers
+# Dead ends advance the pointer of their parent and are never scanned again,
+# after each augmentation the search resumes from the first saturated edge
+def dinitz_dfs(graph, level, source, sink, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= 0 and sink < graph.vertices_count
-    previous_edge = [None] * graph.vertices_count
-    todo = []
-    todo.append(source)
-    while len(todo) > 0:
-        vertex = todo.pop()
-        edges = (edge
-            for edge in graph.edges[vertex]
-            if level[edge.tail] == level[edge.head] + 1
-            if edge.capacity > edge.flow)
-        for edge in edges:
-            next_vertex = edge.head
-            previous_edge[next_vertex] = edge
-            if next_vertex == sink:
-                return find_path(previous_edge, source, sink)
-            todo.append(next_vertex)
+    capacity, flow = graph.capacity, graph.flow
+    tail, head, edges = graph.tail, graph.head, graph.edges
+    current = [0] * graph.vertices_count
+    total_flow = 0
+    path = []
+    vertex = source
+    while True:
+        if vertex == sink:
+            # Saturate the path and retreat to the first saturated edge
+            cost, path_flow = saturate_flow(graph, path)
+            total_flow += path_flow
+            if stats is not None:
+                stats.count('augmentations')
+            i = 0
+            while capacity[path[i]] > flow[path[i]]:
+                i += 1
+            vertex = tail[path[i]]
+            del path[i:]
+            continue
+        vertex_edges = edges[vertex]
+        i = current[vertex]
+        while i < len(vertex_edges):
+            edge = vertex_edges[i]
+            if level[vertex] == level[head[edge]] + 1:
+                if capacity[edge] > flow[edge]:
+                    break
+            i += 1
+        if stats is not None:
+            stats.count('edge_scans', i - current[vertex] + 1)
+        current[vertex] = i
+        if i < len(vertex_edges):
+            # Advance
+            path.append(vertex_edges[i])
+            vertex = head[vertex_edges[i]]
+        elif vertex == source:
+            return total_flow
+        else:
+            # Retreat from the dead end
+            vertex = tail[path.pop()]
+            current[vertex] += 1
 
 # Finds a maximum flow
 # Dinitz algorithm
 # Repeatedly saturates a shortest path in the residual graph
 # Saturates all the shortest paths in a level graph together (blocking flow)
-def dinitz(graph, source, sink):
+def dinitz(graph, source, sink, resume=False, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= 0 and sink < graph.vertices_count
-    graph.reset_flow()
-    total_flow = 0
+    total_flow = initial_flow(graph, source, sink, resume)
     while True:
+        if stats is not None:
+            start = stats.clock()
         # Create the level graph
-        level = dinitz_bfs(graph, source, sink)
+        level = dinitz_bfs(graph, source, sink, stats)
         if level is None:
             return total_flow
-        while True:
-            # Search for a shortest path
-            path = dinitz_dfs(graph, level, source, sink)
-            if path is None:
-                break
-            # Saturate the shortest path
-            cost, flow = saturate_flow(path)
-            total_flow += flow
+        # Saturate a blocking flow
+        total_flow += dinitz_dfs(graph, level, source, sink, stats)
+        if stats is not None:
+            stats.phase('dinitz', start)
+
+# Moves the excess of the active vertices to target
+# Highest-label push-relabel algorithm with the gap heuristic and periodic
+# global relabelling (BFS from target)
+# The excluded vertex keeps its excess and never becomes admissible
+def push_relabel_discharge(graph, excess, target, excluded):
+    n = graph.vertices_count
+    capacity, flow, head = graph.capacity, graph.flow, graph.head
+    reverse, edges = graph.reverse, graph.edges
+    label = [n] * n
+    current = [0] * n
+    # Active vertices and all vertices, by label below n
+    active = [[] for _ in range(n)]
+    members = [set() for _ in range(n)]
+    highest = -1
+    relabels = 0
+    graph.version += 1
+
+    # Labels each vertex with its distance to target in the residual graph
+    def global_relabel():
+        nonlocal highest, relabels
+        for k in range(n):
+            active[k].clear()
+            members[k].clear()
+            label[k] = n
+        label[target] = 0
+        todo = collections.deque()
+        todo.append(target)
+        while len(todo) > 0:
+            vertex = todo.popleft()
+            next_label = label[vertex] + 1
+            for edge in edges[vertex]:
+                next_vertex = head[edge]
+                if label[next_vertex] != n or next_vertex == excluded:
+                    continue
+                if capacity[reverse[edge]] > flow[reverse[edge]]:
+                    label[next_vertex] = next_label
+                    todo.append(next_vertex)
+        highest = -1
+        for vertex in range(n):
+            if label[vertex] < n:
+                members[label[vertex]].add(vertex)
+                current[vertex] = 0
+                if excess[vertex] > 0 and vertex != target:
+                    active[label[vertex]].append(vertex)
+                    highest = max(highest, label[vertex])
+        relabels = 0
+
+    global_relabel()
+    while highest >= 0:
+        if len(active[highest]) == 0:
+            highest -= 1
+            continue
+        vertex = active[highest].pop()
+        vertex_edges = edges[vertex]
+        degree = len(vertex_edges)
+        while excess[vertex] > 0:
+            i = current[vertex]
+            if i == degree:
+                # Relabel
+                old_label = label[vertex]
+                new_label = n
+                for edge in vertex_edges:
+                    if capacity[edge] > flow[edge]:
+                        new_label = min(new_label, label[head[edge]] + 1)
+                members[old_label].discard(vertex)
+                current[vertex] = 0
+                relabels += 1
+                if len(members[old_label]) == 0:
+                    # Gap: the vertices above cannot reach target anymore
+                    for k in range(old_label + 1, n):
+                        if len(members[k]) == 0:
+                            break
+                        for other_vertex in members[k]:
+                            label[other_vertex] = n
+                        members[k].clear()
+                        active[k].clear()
+                    new_label = n
+                label[vertex] = new_label
+                if new_label >= n:
+                    break
+                members[new_label].add(vertex)
+                highest = new_label
+                if relabels >= n:
+                    active[new_label].append(vertex)
+                    break
+                continue
+            edge = vertex_edges[i]
+            next_vertex = head[edge]
+            residual = capacity[edge] - flow[edge]
+            if residual > 0 and label[vertex] == label[next_vertex] + 1:
+                # Push
+                delta = min(excess[vertex], residual)
+                flow[edge] += delta
+                flow[reverse[edge]] -= delta
+                excess[vertex] -= delta
+                if excess[next_vertex] == 0 and next_vertex != target:
+                    active[label[next_vertex]].append(next_vertex)
+                excess[next_vertex] += delta
+                if delta == residual:
+                    current[vertex] = i + 1
+            else:
+                current[vertex] = i + 1
+        if relabels >= n:
+            global_relabel()
+
+# Finds a maximum flow
+# Push-relabel algorithm
+# Saturates the edges leaving source, pushes the excess to sink, then
+# returns to source the excess which cannot reach sink
+def push_relabel(graph, source, sink, resume=False):
+    assert source >= 0 and source < graph.vertices_count
+    assert sink >= 0 and sink < graph.vertices_count
+    total_flow = initial_flow(graph, source, sink, resume)
+    excess = [0] * graph.vertices_count
+    excess[source] = -total_flow
+    excess[sink] = total_flow
+    capacity, flow, head = graph.capacity, graph.flow, graph.head
+    for edge in graph.edges[source]:
+        residual = capacity[edge] - flow[edge]
+        if residual > 0:
+            graph.increase_flow(edge, residual)
+            excess[source] -= residual
+            excess[head[edge]] += residual
+    push_relabel_discharge(graph, excess, sink, source)
+    push_relabel_discharge(graph, excess, source, sink)
+    return excess[sink]
 
 
 if __name__ == "__main__":
 
+    from stats import SolverStats
+
     ### Tests for correctness ###
 
     g = Graph(6)
@@ -139,6 +376,22 @@ if __name__ == "__main__":
     max_flow = dinitz(g, source, sink)
     assert max_flow == 19
 
+    # Push-relabel
+    max_flow = push_relabel(g, source, sink)
+    assert max_flow == 19
+
+    # CSR layout
+    h = CsrGraph.from_graph(g)
+    assert edmonds_karp(h, source, sink) == 19
+    assert dinitz(h, source, sink) == 19
+    assert push_relabel(h, source, sink) == 19
+
+    # Solver statistics
+    stats = SolverStats()
+    assert dinitz(g, source, sink, stats=stats) == 19
+    assert stats.counters['phases'] == len(stats.timings['dinitz'])
+    assert stats.counters['augmentations'] >= stats.counters['phases']
+
     ### Randomized tests ###
 
     import random
@@ -160,3 +413,44 @@ if __name__ == "__main__":
     max_flow_dinitz = dinitz(g, source, sink)
 
     assert max_flow_edmonds_karp == max_flow_dinitz
+
+    # Push-relabel must leave a flow, not a preflow
+    max_flow_push_relabel = push_relabel(g, source, sink)
+    assert max_flow_push_relabel == max_flow_dinitz
+    for vertex in range(vertices_count):
+        if vertex != source and vertex != sink:
+            assert sum(g.flow[edge] for edge in g.edges[vertex]) == 0
+
+    h = CsrGraph.from_graph(g)
+    assert edmonds_karp(h, source, sink) == max_flow_dinitz
+    assert dinitz(h, source, sink) == max_flow_dinitz
+    assert push_relabel(h, source, sink) == max_flow_dinitz
+
+    ### Randomized tests (warm start after capacity changes) ###
+
+    for solver in edmonds_karp, dinitz, push_relabel:
+        g = Graph(vertices_count)
+        for i in range(edges_count):
+            tail = random.randrange(vertices_count)
+            head = random.randrange(vertices_count)
+            capacity = random.randint(1, max_capacity)
+            g.add_edge(tail, head, capacity=capacity)
+        solver(g, source, sink)
+        for i in range(20):
+            for j in range(10):
+                edge = 2 * random.randrange(edges_count)
+                if random.randrange(2) == 0:
+                    g.increase_capacity(edge, random.randint(0, max_capacity))
+                else:
+                    g.decrease_capacity(edge, random.randint(0, g.capacity[edge]))
+            for j in range(5):
+                tail = random.randrange(vertices_count)
+                head = random.randrange(vertices_count)
+                capacity = random.randint(1, max_capacity)
+                g.add_edge(tail, head, capacity=capacity)
+            max_flow_resume = solver(g, source, sink, resume=True)
+            h = CsrGraph.from_graph(g)
+            assert max_flow_resume == dinitz(h, source, sink)
+            for vertex in range(vertices_count):
+                if vertex != source and vertex != sink:
+                    assert outflow(g, vertex) == 0
@@ -1,57 +1,266 @@
 from graph import *
+from max_flow import dinitz, repair_flow
+
+import collections
 from min_cost_path import *
 
+# Cancels the negative-cost cycles of the residual graph
+def cancel_negative_cycles(graph):
+    while True:
+        cycle = find_negative_cycle(graph)
+        if cycle is None:
+            return
+        saturate_flow(graph, cycle)
+
+# Prepares the flow for a solver
+# Either repairs the current flow and makes it a minimum-cost flow of its
+# value, or clears it
+# Returns the cost and value of the flow
+def initial_flow(graph, source, sink, resume):
+    if resume:
+        repair_flow(graph, source, sink)
+        cancel_negative_cycles(graph)
+        return flow_cost(graph), outflow(graph, source)
+    graph.reset_flow()
+    return 0, 0
+
 # Finds a minimum-cost maximum flow
 # Successive shortest paths algorithm (naive implementation)
-def ssp_naive(graph, source, sink):
+def ssp_naive(graph, source, sink, resume=False, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= 0 and sink < graph.vertices_count
-    graph.reset_flow()
-    total_cost = 0
-    total_flow = 0
+    total_cost, total_flow = initial_flow(graph, source, sink, resume)
     while True:
+        if stats is not None:
+            start = stats.clock()
         # Search for a minimum-cost path
-        min_cost, previous_edge = bellman_ford(graph, source)
+        min_cost, previous_edge = bellman_ford(graph, source, stats)
         if min_cost[sink] == infinity:
             return total_cost, total_flow
         # Saturate the minimum-cost path
-        path = find_path(previous_edge, source, sink)
-        cost, flow = saturate_flow(path)
+        path = find_path(graph, previous_edge, source, sink)
+        cost, flow = saturate_flow(graph, path)
         total_cost += cost
         total_flow += flow
+        if stats is not None:
+            stats.count('augmentations')
+            stats.phase('ssp_naive', start)
 
 # Finds a minimum-cost maximum flow
 # Successive shortest paths algorithm
 # Uses reduced costs and Dijkstra for performance
-def ssp(graph, source, sink):
+# Dijkstra stops at the sink, the vertices it did not settle keep their
+# prices, which remain valid since they are at least as far as the sink
+def ssp(graph, source, sink, resume=False, heap=BinaryHeap, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= 0 and sink < graph.vertices_count
-    graph.reset_flow()
-    total_cost = 0
-    total_flow = 0
-    price = [0] * graph.vertices_count
+    total_cost, total_flow = initial_flow(graph, source, sink, resume)
     # Search for a first minimum-cost path
-    min_cost, previous_edge = bellman_ford(graph, source)
+    min_cost, previous_edge = bellman_ford(graph, source, stats)
+    price = [cost if cost != infinity else 0 for cost in min_cost]
     while min_cost[sink] != infinity:
+        if stats is not None:
+            start = stats.clock()
         # Saturate the minimum-cost path
-        path = find_path(previous_edge, source, sink)
-        cost, flow = saturate_flow(path)
+        path = find_path(graph, previous_edge, source, sink)
+        cost, flow = saturate_flow(graph, path)
         total_cost += cost
         total_flow += flow
-        # Adjust the prices
-        for vertex in range(graph.vertices_count):
-            if price[vertex] != infinity:
-                if min_cost[vertex] != infinity:
-                    price[vertex] += min_cost[vertex]
-                else:
-                    price[vertex] = infinity
+        if stats is not None:
+            stats.count('augmentations')
         # Search for a next minimum-cost path
-        min_cost, previous_edge = dijkstra(graph, source, price=price)
+        min_cost, previous_edge = dijkstra(graph, source, sink,
+            price=price, heap=heap, stats=stats)
+        # Adjust the prices of the vertices settled before the sink
+        sink_cost = min_cost[sink]
+        if sink_cost != infinity:
+            updates = 0
+            for vertex in range(graph.vertices_count):
+                if min_cost[vertex] < sink_cost:
+                    price[vertex] += min_cost[vertex] - sink_cost
+                    updates += 1
+            if stats is not None:
+                stats.count('price_updates', updates)
+        if stats is not None:
+            stats.phase('ssp', start)
     return total_cost, total_flow
 
+# Finds a minimum-cost path in the delta-residual graph, from any vertex
+# with an excess of at least delta to any vertex with a deficit of at
+# least delta
+# Dijkstra's algorithm, stops at the first deficit settled and adjusts the
+# prices of the settled vertices
+def ssp_scaling_dijkstra(graph, excess, price, delta, heap):
+    capacity, flow = graph.capacity, graph.flow
+    head, edge_cost = graph.head, graph.cost
+    min_cost = {}
+    previous_edge = {}
+    settled = []
+    visited = set()
+    todo = heap()
+    for vertex in range(graph.vertices_count):
+        if excess[vertex] >= delta:
+            min_cost[vertex] = 0
+            previous_edge[vertex] = None
+            todo.push(0, vertex)
+    while len(todo) > 0:
+        cost, vertex = todo.pop()
+        if vertex in visited:
+            continue
+        visited.add(vertex)
+        settled.append(vertex)
+        if excess[vertex] <= -delta:
+            for other_vertex in settled:
+                price[other_vertex] += min_cost[other_vertex] - cost
+            path = []
+            while previous_edge[vertex] is not None:
+                path.append(previous_edge[vertex])
+                vertex = graph.tail[path[-1]]
+            return list(reversed(path))
+        edges = (edge
+            for edge in graph.edges[vertex]
+            if capacity[edge] - flow[edge] >= delta)
+        for edge in edges:
+            next_vertex = head[edge]
+            next_cost = cost + edge_cost[edge]
+            next_cost += price[vertex] - price[next_vertex]
+            assert next_cost >= cost
+            if next_cost < min_cost.get(next_vertex, infinity):
+                min_cost[next_vertex] = next_cost
+                previous_edge[next_vertex] = edge
+                todo.push(next_cost, next_vertex)
+
+# Finds a minimum-cost maximum flow
+# Capacity-scaling successive shortest paths algorithm
+# Sends the maximum flow value from source to sink, delta units at a time,
+# along edges with a residual capacity of at least delta
+# Each time delta halves, the newly usable edges with a negative reduced
+# cost are saturated and the excesses and deficits they create are resolved
+# by the following shortest paths
+def ssp_scaling(graph, source, sink, heap=BinaryHeap):
+    assert source >= 0 and source < graph.vertices_count
+    assert sink >= 0 and sink < graph.vertices_count
+    total_flow = dinitz(graph, source, sink)
+    graph.reset_flow()
+    capacity, flow = graph.capacity, graph.flow
+    tail, head, cost = graph.tail, graph.head, graph.cost
+    excess = [0] * graph.vertices_count
+    excess[source] += total_flow
+    excess[sink] -= total_flow
+    price = [0] * graph.vertices_count
+    delta = 1 << max(max(capacity, default=1), 1).bit_length() - 1
+    while delta > 0:
+        for edge in range(len(flow)):
+            residual = capacity[edge] - flow[edge]
+            if residual >= delta:
+                if cost[edge] + price[tail[edge]] - price[head[edge]] < 0:
+                    graph.increase_flow(edge, residual)
+                    excess[tail[edge]] -= residual
+                    excess[head[edge]] += residual
+        while True:
+            path = ssp_scaling_dijkstra(graph, excess, price, delta, heap)
+            if path is None:
+                break
+            first, last = tail[path[0]], head[path[-1]]
+            path_flow = min([excess[first], -excess[last]]
+                + [capacity[edge] - flow[edge] for edge in path])
+            for edge in path:
+                graph.increase_flow(edge, path_flow)
+            excess[first] -= path_flow
+            excess[last] += path_flow
+        delta >>= 1
+    assert not any(excess)
+    return flow_cost(graph), total_flow
+
+# Finds a minimum-cost circulation
+# Cycle-cancelling algorithm (Klein)
+def min_cost_circulation(graph, resume=False):
+    if not resume:
+        graph.reset_flow()
+    cancel_negative_cycles(graph)
+    return flow_cost(graph)
+
+# Finds a minimum-cost maximum flow
+# Cycle-cancelling algorithm (Klein)
+# Starts from a maximum flow, then cancels the negative-cost cycles
+def cycle_cancelling(graph, source, sink, resume=False):
+    assert source >= 0 and source < graph.vertices_count
+    assert sink >= 0 and sink < graph.vertices_count
+    total_flow = dinitz(graph, source, sink, resume=resume)
+    total_cost = min_cost_circulation(graph, resume=True)
+    return total_cost, total_flow
+
+# Finds a minimum-cost maximum flow
+# Cost-scaling push-relabel algorithm (Goldberg-Tarjan)
+# Starts from a maximum flow, then lowers eps until the eps-optimal prices
+# are exact, costs are scaled by V + 1 so that eps = 1 is optimal
+def cost_scaling(graph, source, sink, resume=False, alpha=8):
+    assert source >= 0 and source < graph.vertices_count
+    assert sink >= 0 and sink < graph.vertices_count
+    assert alpha >= 2
+    total_flow = dinitz(graph, source, sink, resume=resume)
+    n = graph.vertices_count
+    capacity, flow = graph.capacity, graph.flow
+    tail, head, reverse = graph.tail, graph.head, graph.reverse
+    cost = [edge_cost * (n + 1) for edge_cost in graph.cost]
+    price = [0] * n
+
+    # Turns an (alpha * eps)-optimal flow into an eps-optimal flow
+    def refine(eps):
+        graph.version += 1
+        excess = [0] * n
+        # Saturate the residual edges with a negative reduced cost
+        for edge in range(len(cost)):
+            residual = capacity[edge] - flow[edge]
+            if residual > 0:
+                if cost[edge] + price[tail[edge]] - price[head[edge]] < 0:
+                    graph.increase_flow(edge, residual)
+                    excess[tail[edge]] -= residual
+                    excess[head[edge]] += residual
+        # Discharge the active vertices
+        current = [0] * n
+        todo = collections.deque(
+            vertex for vertex in range(n) if excess[vertex] > 0)
+        while len(todo) > 0:
+            vertex = todo.popleft()
+            vertex_edges = graph.edges[vertex]
+            while excess[vertex] > 0:
+                i = current[vertex]
+                if i == len(vertex_edges):
+                    # Relabel
+                    price[vertex] = max(price[head[edge]] - cost[edge]
+                        for edge in vertex_edges
+                        if capacity[edge] > flow[edge]) - eps
+                    current[vertex] = 0
+                    continue
+                edge = vertex_edges[i]
+                next_vertex = head[edge]
+                residual = capacity[edge] - flow[edge]
+                if residual > 0:
+                    if cost[edge] + price[vertex] - price[next_vertex] < 0:
+                        # Push
+                        delta = min(excess[vertex], residual)
+                        flow[edge] += delta
+                        flow[reverse[edge]] -= delta
+                        excess[vertex] -= delta
+                        excess[next_vertex] += delta
+                        if 0 < excess[next_vertex] <= delta:
+                            todo.append(next_vertex)
+                        if delta < residual:
+                            continue
+                current[vertex] = i + 1
+
+    eps = max([abs(edge_cost) for edge_cost in cost] + [1])
+    while eps > 1:
+        eps = max(1, -(-eps // alpha))
+        refine(eps)
+    return flow_cost(graph), total_flow
+
 
 if __name__ == "__main__":
 
+    from stats import SolverStats
+
     ### Tests for correctness ###
 
     g = Graph(7)
@@ -77,6 +286,49 @@ if __name__ == "__main__":
     assert min_cost == 12
     assert max_flow == 5
 
+    # Successive shortest paths (radix heap)
+    min_cost, max_flow = ssp(g, source, sink, heap=RadixHeap)
+    assert min_cost == 12
+    assert max_flow == 5
+
+    # Capacity scaling
+    min_cost, max_flow = ssp_scaling(g, source, sink)
+    assert min_cost == 12
+    assert max_flow == 5
+
+    # Cycle cancelling
+    min_cost, max_flow = cycle_cancelling(g, source, sink)
+    assert min_cost == 12
+    assert max_flow == 5
+
+    # Cost scaling
+    min_cost, max_flow = cost_scaling(g, source, sink)
+    assert min_cost == 12
+    assert max_flow == 5
+
+    # Solver statistics
+    stats = SolverStats()
+    assert ssp(g, source, sink, stats=stats) == (12, 5)
+    assert stats.counters['phases'] == stats.counters['augmentations']
+    assert stats.to_dict()['timings']['ssp']['count'] \
+        == stats.counters['augmentations']
+
+    # CSR layout
+    h = CsrGraph.from_graph(g)
+    assert ssp_naive(h, source, sink) == (12, 5)
+    assert ssp(h, source, sink) == (12, 5)
+    assert cost_scaling(h, source, sink) == (12, 5)
+
+    ### Tests for correctness (circulation) ###
+
+    g = Graph(3)
+    g.add_edge(0, 1, capacity=4, cost=-3)
+    g.add_edge(1, 2, capacity=2, cost=1)
+    g.add_edge(2, 0, capacity=5, cost=1)
+    g.add_edge(1, 0, capacity=1, cost=2)
+    assert min_cost_circulation(g) == -3
+    assert [g.flow[edge] for edge in range(0, 8, 2)] == [3, 2, 2, 1]
+
     ### Randomized tests (negative costs, no negative-cost cycle) ###
 
     import random
@@ -104,3 +356,45 @@ if __name__ == "__main__":
 
     assert min_cost_ssp_naive == min_cost_ssp
     assert max_flow_ssp_naive == max_flow_ssp
+
+    # Successive shortest paths (radix heap)
+    assert ssp(g, source, sink, heap=RadixHeap) == (min_cost_ssp, max_flow_ssp)
+
+    # Capacity scaling
+    assert ssp_scaling(g, source, sink) == (min_cost_ssp, max_flow_ssp)
+    assert ssp_scaling(g, source, sink, heap=RadixHeap) == (min_cost_ssp, max_flow_ssp)
+
+    # Cycle cancelling
+    assert cycle_cancelling(g, source, sink) == (min_cost_ssp, max_flow_ssp)
+
+    # Cost scaling
+    assert cost_scaling(g, source, sink) == (min_cost_ssp, max_flow_ssp)
+
+    h = CsrGraph.from_graph(g)
+    assert ssp(h, source, sink) == (min_cost_ssp, max_flow_ssp)
+
+    ### Randomized tests (warm start after capacity changes) ###
+
+    for solver in ssp_naive, ssp:
+        g = Graph(vertices_count)
+        for i in range(edges_count):
+            tail = random.randrange(vertices_count - 1)
+            head = random.randrange(tail + 1, vertices_count)
+            capacity = random.randint(1, max_capacity)
+            cost = random.randint(-max_cost, max_cost)
+            g.add_edge(tail, head, capacity=capacity, cost=cost)
+        solver(g, source, sink)
+        for i in range(5):
+            for j in range(5):
+                edge = 2 * random.randrange(edges_count)
+                if random.randrange(2) == 0:
+                    g.increase_capacity(edge, random.randint(0, max_capacity))
+                else:
+                    g.decrease_capacity(edge, random.randint(0, g.capacity[edge]))
+            tail = random.randrange(vertices_count - 1)
+            head = random.randrange(tail + 1, vertices_count)
+            capacity = random.randint(1, max_capacity)
+            cost = random.randint(-max_cost, max_cost)
+            g.add_edge(tail, head, capacity=capacity, cost=cost)
+            result_resume = solver(g, source, sink, resume=True)
+            assert result_resume == ssp(CsrGraph.from_graph(g), source, sink)
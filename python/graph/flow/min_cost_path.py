@@ -1,74 +1,187 @@
 from graph import *
 
+import collections
 import heapq
 
+# Binary heap of (key, vertex) pairs
+class BinaryHeap:
+
+    def __init__(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, key, vertex):
+        heapq.heappush(self.heap, (key, vertex))
+
+    def pop(self):
+        return heapq.heappop(self.heap)
+
+# Radix heap of (key, vertex) pairs
+# Keys are non-negative integers, never below the last key popped
+# Bucket i holds the keys whose highest bit differing from the last key
+# popped is bit i - 1, a pop redistributes the first non-empty bucket
+class RadixHeap:
+
+    def __init__(self):
+        self.last = 0
+        self.size = 0
+        self.buckets = [[]]
+
+    def __len__(self):
+        return self.size
+
+    def push(self, key, vertex):
+        assert key >= self.last
+        i = (key ^ self.last).bit_length()
+        while len(self.buckets) <= i:
+            self.buckets.append([])
+        self.buckets[i].append((key, vertex))
+        self.size += 1
+
+    def pop(self):
+        assert self.size > 0
+        if len(self.buckets[0]) == 0:
+            i = 1
+            while len(self.buckets[i]) == 0:
+                i += 1
+            bucket = self.buckets[i]
+            self.buckets[i] = []
+            self.last = min(bucket)[0]
+            for key, vertex in bucket:
+                self.buckets[(key ^ self.last).bit_length()].append((key, vertex))
+        self.size -= 1
+        return self.buckets[0].pop()
+
 # Finds a minimum-cost path in the residual graph
 # Dijkstra's agorithm
 # Uses reduced costs if we provide prices
-def dijkstra(graph, source, sink=-1, price=None):
+# Stops once sink is settled if we provide a sink
+def dijkstra(graph, source, sink=-1, price=None, heap=BinaryHeap, stats=None):
     assert source >= 0 and source < graph.vertices_count
     assert sink >= -1 and sink < graph.vertices_count
     min_cost = [infinity] * graph.vertices_count
     min_cost[source] = 0
     previous_edge = [None] * graph.vertices_count
     visited = [False] * graph.vertices_count
-    todo = []
-    heapq.heappush(todo, (0, source))
+    capacity, flow = graph.capacity, graph.flow
+    head, edge_cost = graph.head, graph.cost
+    todo = heap()
+    todo.push(0, source)
+    pops = 0
     while len(todo) > 0:
-        cost, vertex = heapq.heappop(todo)
+        cost, vertex = todo.pop()
+        pops += 1
         if not visited[vertex]:
             visited[vertex] = True
             if vertex == sink:
                 break
+            if stats is not None:
+                stats.count('edge_scans', len(graph.edges[vertex]))
             edges = (edge
                 for edge in graph.edges[vertex]
-                if edge.capacity > edge.flow)
+                if capacity[edge] > flow[edge])
             for edge in edges:
-                next_vertex = edge.head
-                next_cost = cost + edge.cost
+                next_vertex = head[edge]
+                next_cost = cost + edge_cost[edge]
                 if price is not None:
-                    next_cost += price[edge.tail] - price[edge.head]
+                    next_cost += price[vertex] - price[next_vertex]
                 assert next_cost >= cost
                 if next_cost < min_cost[next_vertex]:
                     min_cost[next_vertex] = next_cost
                     previous_edge[next_vertex] = edge
-                    heapq.heappush(todo, (next_cost, next_vertex))
+                    todo.push(next_cost, next_vertex)
+    if stats is not None:
+        # The entries left in the heap were pushed but never popped
+        stats.count('heap_pops', pops)
+        stats.count('heap_pushes', pops + len(todo))
+        stats.count('stale_heap_entries', pops - sum(visited))
     return min_cost, previous_edge
 
+# Negative-cost cycle in the residual graph, as a list of edges
+class NegativeCycleError(ValueError):
+
+    def __init__(self, cycle):
+        ValueError.__init__(self, 'negative-cost cycle')
+        self.cycle = cycle
+
+# Finds the cycle reached by walking back the parent links from a vertex
+def find_cycle(graph, previous_edge, vertex):
+    for k in range(graph.vertices_count):
+        vertex = graph.tail[previous_edge[vertex]]
+    cycle = [previous_edge[vertex]]
+    while graph.tail[cycle[-1]] != vertex:
+        cycle.append(previous_edge[graph.tail[cycle[-1]]])
+    return list(reversed(cycle))
+
+# Lowers the costs from the vertices in todo until they are minimal
+# Bellman-Ford-Moore algorithm (FIFO label-correcting)
+# Returns a vertex whose parent links lead to a negative-cost cycle if any
+def bellman_ford_moore(graph, min_cost, previous_edge, todo, stats=None):
+    capacity, flow = graph.capacity, graph.flow
+    head, edge_cost = graph.head, graph.cost
+    queued = [False] * graph.vertices_count
+    for vertex in todo:
+        queued[vertex] = True
+    # Loop invariant: after k passes min_cost[vertex] is at most
+    # the minimum cost to vertex following up to k edges, a cost still
+    # decreasing after V passes implies a cycle in the parent links
+    passes = 0
+    while len(todo) > 0:
+        passes += 1
+        if stats is not None:
+            stats.count('passes')
+        for i in range(len(todo)):
+            vertex = todo.popleft()
+            queued[vertex] = False
+            if stats is not None:
+                stats.count('edge_scans', len(graph.edges[vertex]))
+            edges = (edge
+                for edge in graph.edges[vertex]
+                if capacity[edge] > flow[edge])
+            for edge in edges:
+                next_vertex = head[edge]
+                next_cost = min_cost[vertex] + edge_cost[edge]
+                if next_cost < min_cost[next_vertex]:
+                    min_cost[next_vertex] = next_cost
+                    previous_edge[next_vertex] = edge
+                    if passes >= graph.vertices_count:
+                        return next_vertex
+                    if not queued[next_vertex]:
+                        queued[next_vertex] = True
+                        todo.append(next_vertex)
+
 # Finds a minimum-cost path in the residual graph
 # Bellman-Ford algorithm
-def bellman_ford(graph, source):
+# Raises NegativeCycleError if a negative-cost cycle is reachable
+def bellman_ford(graph, source, stats=None):
     assert source >= 0 and source < graph.vertices_count
     min_cost = [infinity] * graph.vertices_count
     min_cost[source] = 0
     previous_edge = [None] * graph.vertices_count
-    todo = set()
-    todo.add(source)
-    # Loop invariant: before each iteration min_cost[vertex] is
-    # the minimum cost from source to vertex following up to k edges
-    for k in range(graph.vertices_count):
-        new_min_cost = list(min_cost)
-        new_todo = set()
-        for vertex in todo:
-            edges = (edge
-                for edge in graph.edges[vertex]
-                if edge.capacity > edge.flow)
-            for edge in edges:
-                next_vertex = edge.head
-                next_cost = min_cost[vertex] + edge.cost
-                if next_cost < new_min_cost[next_vertex]:
-                    new_min_cost[next_vertex] = next_cost
-                    previous_edge[next_vertex] = edge
-                    new_todo.add(next_vertex)
-        min_cost = new_min_cost
-        todo = new_todo
-        if len(todo) == 0:
-            return min_cost, previous_edge
-    raise ValueError('negative-cost cycle')
+    todo = collections.deque()
+    todo.append(source)
+    vertex = bellman_ford_moore(graph, min_cost, previous_edge, todo, stats)
+    if vertex is not None:
+        raise NegativeCycleError(find_cycle(graph, previous_edge, vertex))
+    return min_cost, previous_edge
 
+# Finds a negative-cost cycle anywhere in the residual graph
+# Bellman-Ford algorithm from all the vertices at once
+# Returns the list of edges of the cycle, or None
+def find_negative_cycle(graph):
+    min_cost = [0] * graph.vertices_count
+    previous_edge = [None] * graph.vertices_count
+    todo = collections.deque(range(graph.vertices_count))
+    vertex = bellman_ford_moore(graph, min_cost, previous_edge, todo)
+    if vertex is not None:
+        return find_cycle(graph, previous_edge, vertex)
 
 if __name__ == "__main__":
 
+    from stats import SolverStats
+
     ### Tests for correctness ###
 
     g = Graph(4)
@@ -82,11 +195,28 @@ if __name__ == "__main__":
     # Dijkstra
     min_cost, previous_edge = dijkstra(g, source)
     assert min_cost == [0, 5, 10, 12]
+    min_cost, previous_edge = dijkstra(g, source, heap=RadixHeap)
+    assert min_cost == [0, 5, 10, 12]
 
     # Bellman-Ford
     min_cost, previous_edge = bellman_ford(g, source)
     assert min_cost == [0, 5, 10, 12]
 
+    # Solver statistics
+    stats = SolverStats()
+    dijkstra(g, source, stats=stats)
+    assert stats.counters['heap_pushes'] == 5
+    assert stats.counters['heap_pops'] == 5
+    assert stats.counters['stale_heap_entries'] == 1
+    stats = SolverStats()
+    bellman_ford(g, source, stats=stats)
+    assert stats.counters['passes'] == 3
+
+    # CSR layout
+    h = CsrGraph.from_graph(g)
+    assert dijkstra(h, source)[0] == [0, 5, 10, 12]
+    assert bellman_ford(h, source)[0] == [0, 5, 10, 12]
+
     ### Tests for correctness (negative-cost cycles) ###
 
     # Negative costs, but no negative-cost cycle
@@ -107,8 +237,26 @@ if __name__ == "__main__":
 
     error = False
     try: min_cost, previous_edge = bellman_ford(g, source)
-    except ValueError: error = True
+    except NegativeCycleError as e: error = e
     assert error
+    assert sorted(error.cycle) == [0, 2, 4]
+
+    cycle = find_negative_cycle(g)
+    assert sorted(cycle) == [0, 2, 4]
+
+    # Negative-cost cycle unreachable from source
+    g = Graph(5)
+    g.add_edge(0, 1, cost=1)
+    g.add_edge(2, 3, cost=2)
+    g.add_edge(3, 4, cost=-2)
+    g.add_edge(4, 2, cost=-1)
+    source = 0
+
+    min_cost, previous_edge = bellman_ford(g, source)
+    assert min_cost == [0, 1, infinity, infinity, infinity]
+    cycle = find_negative_cycle(g)
+    assert [(g.tail[edge], g.head[edge]) for edge in cycle] \
+        in ([(2, 3), (3, 4), (4, 2)], [(3, 4), (4, 2), (2, 3)], [(4, 2), (2, 3), (3, 4)])
 
     ### Randomized tests ###
 
@@ -130,12 +278,49 @@ if __name__ == "__main__":
     # Dijkstra
     min_cost, previous_edge = dijkstra(g, source, sink)
     dijkstra_cost = min_cost[sink]
-    dijkstra_path = find_path(previous_edge, source, sink)
+    dijkstra_path = find_path(g, previous_edge, source, sink)
 
     # Bellman-Ford
     min_cost, previous_edge = bellman_ford(g, source)
     bellman_ford_cost = min_cost[sink]
-    bellman_ford_path = find_path(previous_edge, source, sink)
+    bellman_ford_path = find_path(g, previous_edge, source, sink)
 
     assert dijkstra_cost == bellman_ford_cost
     assert dijkstra_path == bellman_ford_path
+
+    # Dijkstra (radix heap)
+    min_cost, previous_edge = dijkstra(g, source, sink, heap=RadixHeap)
+    assert min_cost[sink] == bellman_ford_cost
+
+    ### Randomized tests (radix heap) ###
+
+    heap = RadixHeap()
+    keys = []
+    for i in range(1000):
+        if len(keys) > 0 and random.randrange(3) == 0:
+            key, vertex = heap.pop()
+            assert key == min(keys)
+            keys.remove(key)
+        else:
+            key = heap.last + random.randint(0, 1000)
+            heap.push(key, i)
+            keys.append(key)
+    assert len(heap) == len(keys)
+
+    ### Randomized tests (negative-cost cycles) ###
+
+    vertices_count = 50
+    edges_count = 200
+
+    for i in range(20):
+        g = Graph(vertices_count)
+        for j in range(edges_count):
+            tail = random.randrange(vertices_count)
+            head = random.randrange(vertices_count)
+            cost = random.randint(-max_cost // 10, max_cost)
+            g.add_edge(tail, head, cost=cost)
+        cycle = find_negative_cycle(g)
+        if cycle is not None:
+            assert sum(g.cost[edge] for edge in cycle) < 0
+            for j in range(len(cycle)):
+                assert g.head[cycle[j - 1]] == g.tail[cycle[j]]
@@ -0,0 +1,142 @@
+from graph import *
+from max_flow import dinitz
+
+import collections
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import lca
+
+# Finds the vertices reachable from source in the residual graph
+# BFS algorithm
+# After a maximum flow, this is the source side of a minimum cut
+def source_side(graph, source):
+    assert source >= 0 and source < graph.vertices_count
+    capacity, flow, head = graph.capacity, graph.flow, graph.head
+    side = [False] * graph.vertices_count
+    side[source] = True
+    todo = collections.deque()
+    todo.append(source)
+    while len(todo) > 0:
+        vertex = todo.popleft()
+        edges = (edge
+            for edge in graph.edges[vertex]
+            if capacity[edge] > flow[edge])
+        for edge in edges:
+            next_vertex = head[edge]
+            if not side[next_vertex]:
+                side[next_vertex] = True
+                todo.append(next_vertex)
+    return side
+
+# Finds a minimum cut between source and sink
+# Returns the capacity of the cut, whether each vertex is on the source
+# side, and the edges from the source side to the sink side
+def min_cut(graph, source, sink, solver=dinitz):
+    assert source >= 0 and source < graph.vertices_count
+    assert sink >= 0 and sink < graph.vertices_count
+    cut_capacity = solver(graph, source, sink)
+    side = source_side(graph, source)
+    capacity, head = graph.capacity, graph.head
+    cut_edges = [edge
+        for vertex in range(graph.vertices_count) if side[vertex]
+        for edge in graph.edges[vertex]
+        if capacity[edge] > 0 and not side[head[edge]]]
+    return cut_capacity, side, cut_edges
+
+# Gomory-Hu tree of an undirected graph, each undirected edge being two
+# opposite edges with the same capacity
+# Gusfield's algorithm, V - 1 maximum flows on the original graph
+# The minimum cut between two vertices is the lightest edge on their
+# tree path, which is the lowest common ancestor in the tree obtained by
+# merging the tree edges from the heaviest (Kruskal reconstruction tree)
+class GomoryHuTree:
+
+    def __init__(self, graph, solver=dinitz):
+        n = graph.vertices_count
+        self.vertices_count = n
+        # Tree edges, between each vertex but 0 and its parent
+        self.parent = [0] * n
+        self.weight = [infinity] * n
+        for vertex in range(1, n):
+            parent = self.parent[vertex]
+            self.weight[vertex], side, cut_edges = min_cut(
+                graph, vertex, parent, solver)
+            for other_vertex in range(vertex + 1, n):
+                if side[other_vertex] and self.parent[other_vertex] == parent:
+                    self.parent[other_vertex] = vertex
+        # Kruskal reconstruction tree, vertices are its leaves
+        # and each merge is an internal node weighted by its tree edge
+        node_weight = [infinity] * (2 * n - 1)
+        component = list(range(n))
+        component_node = list(range(n))
+        def find(vertex):
+            while component[vertex] != vertex:
+                component[vertex] = component[component[vertex]]
+                vertex = component[vertex]
+            return vertex
+        tree = lca.RootedTree(2 * n - 1, 2 * n - 2)
+        order = sorted(range(1, n), key=lambda vertex: -self.weight[vertex])
+        for node, vertex in enumerate(order, n):
+            u, v = find(vertex), find(self.parent[vertex])
+            node_weight[node] = self.weight[vertex]
+            tree.add_edge(node, component_node[u])
+            tree.add_edge(node, component_node[v])
+            component[u] = v
+            component_node[v] = node
+        self.node_weight = node_weight
+        self.lca_tree = lca.lca_build(tree)
+
+    # Queries for the minimum cut capacity between two vertices
+    def query(self, u, v):
+        assert u >= 0 and u < self.vertices_count
+        assert v >= 0 and v < self.vertices_count
+        return self.node_weight[lca.lca_query(self.lca_tree, u, v)]
+
+
+if __name__ == "__main__":
+
+    ### Tests for correctness ###
+
+    g = Graph(6)
+    g.add_edge(0, 1, capacity=10)
+    g.add_edge(0, 2, capacity=10)
+    g.add_edge(1, 2, capacity=2)
+    g.add_edge(1, 3, capacity=4)
+    g.add_edge(1, 4, capacity=8)
+    g.add_edge(2, 4, capacity=9)
+    g.add_edge(3, 5, capacity=10)
+    g.add_edge(4, 3, capacity=6)
+    g.add_edge(4, 5, capacity=10)
+    source = 0
+    sink = 5
+
+    cut_capacity, side, cut_edges = min_cut(g, source, sink)
+    assert cut_capacity == 19
+    assert side == [True, False, True, False, False, False]
+    assert sum(g.capacity[edge] for edge in cut_edges) == 19
+    assert sorted((g.tail[edge], g.head[edge]) for edge in cut_edges) \
+        == [(0, 1), (2, 4)]
+
+    ### Randomized tests ###
+
+    import random
+
+    vertices_count = 20
+    edges_count = 60
+    max_capacity = 100
+
+    g = Graph(vertices_count)
+    for i in range(edges_count):
+        u = random.randrange(vertices_count)
+        v = random.randrange(vertices_count)
+        capacity = random.randint(1, max_capacity)
+        g.add_edge(u, v, capacity=capacity)
+        g.add_edge(v, u, capacity=capacity)
+
+    gomory_hu = GomoryHuTree(g)
+    for u in range(vertices_count):
+        for v in range(vertices_count):
+            if u != v:
+                assert gomory_hu.query(u, v) == dinitz(g, u, v)
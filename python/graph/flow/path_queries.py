@@ -0,0 +1,160 @@
+from graph import *
+from min_cost_path import *
+
+import collections
+import multiprocessing
+
+# Answers the queries from one source given its minimum-cost tree
+# Returns the cost of each path and its list of edges,
+# infinity and None if the sink is unreachable
+def tree_answers(graph, tree, price, source, sinks):
+    min_cost, previous_edge = tree
+    answers = []
+    for sink in sinks:
+        assert sink >= 0 and sink < graph.vertices_count
+        if min_cost[sink] == infinity:
+            answers.append((infinity, None))
+            continue
+        cost = min_cost[sink]
+        if price is not None:
+            cost += price[sink] - price[source]
+        answers.append((cost, find_path(graph, previous_edge, source, sink)))
+    return answers
+
+# Answers batches of minimum-cost path queries on a residual graph
+# Queries are grouped by source so that one Dijkstra tree serves all of
+# them, the trees of the most recently used sources are kept until the
+# graph changes (LRU cache)
+# Uses reduced costs if we provide prices, the costs returned are the
+# costs of the paths nonetheless
+class PathQueries:
+
+    def __init__(self, graph, cache_size=64, price=None, heap=BinaryHeap):
+        assert cache_size > 0
+        self.graph = graph
+        self.cache_size = cache_size
+        self.price = price
+        self.heap = heap
+        self.cache = collections.OrderedDict()
+        self.version = graph.version
+
+    def invalidate(self):
+        if self.version != self.graph.version:
+            self.cache.clear()
+            self.version = self.graph.version
+
+    # Returns the minimum-cost tree from source
+    def tree(self, source):
+        self.invalidate()
+        if source in self.cache:
+            self.cache.move_to_end(source)
+            return self.cache[source]
+        return self.store(source,
+            dijkstra(self.graph, source, price=self.price, heap=self.heap))
+
+    def store(self, source, tree):
+        self.cache[source] = tree
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return tree
+
+    # Queries for the cost of the minimum-cost path and its list of edges
+    # infinity and None if sink is unreachable
+    def query(self, source, sink):
+        tree = self.tree(source)
+        return tree_answers(self.graph, tree, self.price, source, [sink])[0]
+
+    # Queries for a batch of (source, sink) pairs, answers in order
+    # Sources without a cached tree are sent to a pool of processes if
+    # requested, each process receives the graph once and a share of the
+    # sources, and returns its answers rather than its trees
+    def query_many(self, queries, processes=None):
+        self.invalidate()
+        by_source = collections.OrderedDict()
+        for i, (source, sink) in enumerate(queries):
+            assert source >= 0 and source < self.graph.vertices_count
+            by_source.setdefault(source, []).append(i)
+        answers = [None] * len(queries)
+        def store_answers(source, source_answers):
+            for i, answer in zip(by_source[source], source_answers):
+                answers[i] = answer
+        remote = []
+        for source, indices in by_source.items():
+            sinks = [queries[i][1] for i in indices]
+            if processes is None or source in self.cache:
+                tree = self.tree(source)
+                store_answers(source, tree_answers(
+                    self.graph, tree, self.price, source, sinks))
+            else:
+                remote.append((source, sinks))
+        if len(remote) > 0:
+            with multiprocessing.Pool(processes, _worker_init,
+                    (self.graph, self.price, self.heap)) as pool:
+                chunksize = max(1, len(remote) // (4 * processes))
+                results = pool.map(_worker_answers, remote, chunksize)
+            for (source, sinks), source_answers in zip(remote, results):
+                store_answers(source, source_answers)
+        return answers
+
+_worker_args = None
+
+def _worker_init(graph, price, heap):
+    global _worker_args
+    _worker_args = graph, price, heap
+
+def _worker_answers(source_sinks):
+    graph, price, heap = _worker_args
+    source, sinks = source_sinks
+    tree = dijkstra(graph, source, price=price, heap=heap)
+    return tree_answers(graph, tree, price, source, sinks)
+
+
+if __name__ == "__main__":
+
+    ### Tests for correctness ###
+
+    g = Graph(4)
+    g.add_edge(0, 1, cost=5)
+    g.add_edge(1, 2, cost=5)
+    g.add_edge(2, 3, cost=5)
+    g.add_edge(0, 2, cost=12)
+    g.add_edge(1, 3, cost=7)
+
+    q = PathQueries(g)
+    assert q.query_many([(0, 3), (0, 2), (1, 3), (3, 0)]) == [
+        (12, [0, 8]), (10, [0, 2]), (7, [8]), (infinity, None)]
+
+    # The cache is invalidated when the capacities change
+    g.decrease_capacity(8, 1)
+    assert q.query(0, 3) == (15, [0, 2, 4])
+
+    ### Randomized tests ###
+
+    import random
+
+    vertices_count = 100
+    edges_count = 2000
+    max_cost = 1000
+
+    g = Graph(vertices_count)
+    for i in range(edges_count):
+        tail = random.randrange(vertices_count)
+        head = random.randrange(vertices_count)
+        cost = random.randint(0, max_cost)
+        g.add_edge(tail, head, cost=cost)
+    queries = [(random.randrange(20), random.randrange(vertices_count))
+        for i in range(500)]
+
+    expected = [dijkstra(g, source, sink)[0][sink]
+        for source, sink in queries]
+
+    q = PathQueries(g, cache_size=8)
+    answers = q.query_many(queries)
+    assert [cost for cost, path in answers] == expected
+    for (source, sink), (cost, path) in zip(queries, answers):
+        assert sum(g.cost[edge] for edge in path) == cost
+
+    q = PathQueries(CsrGraph.from_graph(g))
+    q.tree(0)
+    answers = q.query_many(queries, processes=2)
+    assert [cost for cost, path in answers] == expected
@@ -0,0 +1,63 @@
+import collections
+import json
+import time
+
+# Counters and timings of the work done by a solver
+# Solvers take an optional stats argument and add to its counters, the
+# checks on a missing stats object being their only overhead
+# Counters:
+# augmentations: augmenting paths saturated
+# edge_scans: edges looked at when leaving a vertex
+# phases: phases timed, see below
+# passes: Bellman-Ford-Moore passes over the queue
+# heap_pushes, heap_pops: Dijkstra heap operations
+# stale_heap_entries: entries popped for already settled vertices
+# price_updates: vertex prices changed between two Dijkstra runs
+class SolverStats:
+
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.timings = collections.defaultdict(list)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    # Returns the start time of a phase
+    def clock(self):
+        return time.perf_counter()
+
+    # Records a phase which started at the given time
+    def phase(self, name, start):
+        self.timings[name].append(time.perf_counter() - start)
+        self.counters['phases'] += 1
+
+    # Counters and a summary of the timings of each kind of phase, in seconds
+    def to_dict(self):
+        timings = {}
+        for name, seconds in self.timings.items():
+            timings[name] = {
+                'count': len(seconds),
+                'total': sum(seconds),
+                'min': min(seconds),
+                'max': max(seconds),
+            }
+        return {'counters': dict(self.counters), 'timings': timings}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+if __name__ == "__main__":
+
+    ### Tests for correctness ###
+
+    stats = SolverStats()
+    stats.count('augmentations')
+    stats.count('edge_scans', 10)
+    for i in range(3):
+        stats.phase('dinitz', stats.clock())
+    result = json.loads(stats.to_json())
+    assert result['counters'] == {
+        'augmentations': 1, 'edge_scans': 10, 'phases': 3}
+    assert result['timings']['dinitz']['count'] == 3
+    assert result['timings']['dinitz']['total'] >= 0
@@ -0,0 +1,131 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'search'))
+import fenwick
+import lca
+
+# Heavy-light decomposition of a rooted tree
+# Each vertex continues the chain of its parent if it has the largest
+# subtree among its siblings (heavy child), a path crosses O(log n) chains
+# The vertices are numbered in DFS order with the heavy child first, so
+# that each chain and each subtree is a contiguous range of positions
+# The values of the vertices are kept in Fenwick trees by position:
+# O(log^2 n) path updates and queries, O(log n) subtree ones
+class HeavyLightDecomposition:
+
+    def __init__(self, tree):
+        n = tree.vertices_count
+        self.tree = tree
+        if tree.depth is None:
+            tree.build_depth()
+        # Subtree sizes, children after their parent in BFS order
+        order = [tree.root]
+        for u in order:
+            order.extend(tree.children[u])
+        self.size = size = [1] * n
+        for u in reversed(order):
+            if u != tree.root:
+                size[tree.parent[u]] += size[u]
+        # Positions and chain heads, DFS with the heavy child last on the
+        # stack so that it follows its parent
+        self.position = position = [None] * n
+        self.head = head = [None] * n
+        head[tree.root] = tree.root
+        todo = [tree.root]
+        for i in range(n):
+            u = todo.pop()
+            position[u] = i
+            children = tree.children[u]
+            if len(children) == 0:
+                continue
+            heavy = max(children, key=lambda v: size[v])
+            for v in children:
+                if v != heavy:
+                    head[v] = v
+                    todo.append(v)
+            head[heavy] = head[u]
+            todo.append(heavy)
+        self.values = fenwick.UpdateRangeQueryRange(n)
+
+    # Splits the path between two vertices into ranges of positions
+    def path_ranges(self, u, v):
+        tree, position, head = self.tree, self.position, self.head
+        assert u >= 0 and u < tree.vertices_count
+        assert v >= 0 and v < tree.vertices_count
+        ranges = []
+        while head[u] != head[v]:
+            if tree.depth[head[u]] < tree.depth[head[v]]:
+                u, v = v, u
+            ranges.append((position[head[u]], position[u]))
+            u = tree.parent[head[u]]
+        if position[u] > position[v]:
+            u, v = v, u
+        ranges.append((position[u], position[v]))
+        return ranges
+
+    # Adds delta to the value of each vertex on the path between two vertices
+    def update_path(self, u, v, delta):
+        for index1, index2 in self.path_ranges(u, v):
+            self.values.update_range(index1, index2, delta)
+
+    # Returns the sum of the values of the vertices on the path between two
+    # vertices
+    def query_path(self, u, v):
+        return sum(self.values.query_range(index1, index2)
+            for index1, index2 in self.path_ranges(u, v))
+
+    # Adds delta to the value of each vertex in the subtree of a vertex
+    def update_subtree(self, u, delta):
+        assert u >= 0 and u < self.tree.vertices_count
+        index = self.position[u]
+        self.values.update_range(index, index + self.size[u] - 1, delta)
+
+    # Returns the sum of the values of the vertices in the subtree of a vertex
+    def query_subtree(self, u):
+        assert u >= 0 and u < self.tree.vertices_count
+        index = self.position[u]
+        return self.values.query_range(index, index + self.size[u] - 1)
+
+
+### Tests for correctness ###
+
+import random
+
+vertices_count = 300
+t = lca.RootedTree(vertices_count)
+for v in range(1, vertices_count):
+    t.add_edge(random.randrange(max(0, v - 5), v), v)
+lca_t = lca.lca_build(t)
+
+hld = HeavyLightDecomposition(t)
+assert sorted(hld.position) == list(range(vertices_count))
+
+def subtree(u):
+    vertices = [u]
+    for w in vertices:
+        vertices.extend(t.children[w])
+    return vertices
+
+values = [0] * vertices_count
+for i in range(1000):
+    u = random.randrange(vertices_count)
+    v = random.randrange(vertices_count)
+    path = lca.find_path(lca_t, u, v)
+    assert len(hld.path_ranges(u, v)) <= 2 * vertices_count.bit_length()
+    operation = random.randrange(4)
+    if operation == 0:
+        delta = random.randint(-100, 100)
+        hld.update_path(u, v, delta)
+        for w in path:
+            values[w] += delta
+    elif operation == 1:
+        assert hld.query_path(u, v) == sum(values[w] for w in path)
+    elif operation == 2:
+        delta = random.randint(-100, 100)
+        hld.update_subtree(u, delta)
+        for w in subtree(u):
+            values[w] += delta
+    else:
+        assert hld.query_subtree(u) == sum(values[w] for w in subtree(u))
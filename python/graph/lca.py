@@ -1,6 +1,89 @@
-# Naive range minimum query
-rmq_build = lambda table: table
-rmq_query = lambda table, i0, i1: min(table[i0:i1+1])
+import array
+import functools
+import mmap
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', 'search'))
+import rmq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Range minimum query backends for the Euler tour
+# Each is built from the table and queries the minimum of table[i0:i1+1]
+# The Euler tour of a tree of n vertices has 2n - 1 values, about 20M for
+# 10M vertices
+
+# Naive range minimum query, O(1) space, O(n) time per query
+# Memory: the tour only
+class NaiveRmq:
+
+    def __init__(self, table):
+        self.table = table
+
+    def query(self, i0, i1):
+        return min(self.table[i0:i1+1])
+
+    def arrays(self):
+        return [self.table]
+
+    @staticmethod
+    def from_arrays(arrays):
+        rmq_backend = NaiveRmq.__new__(NaiveRmq)
+        rmq_backend.table, = arrays
+        return rmq_backend
+
+# Sparse table, O(n log n) space, O(1) time per query
+# Memory: a list per level, log2(2n) + 1 lists of up to 2n values, about
+# 25 x 20M values for 10M vertices (several GB), for small trees only
+class SparseRmq:
+
+    def __init__(self, table):
+        self.table = rmq.rmq_build(table)
+
+    def query(self, i0, i1):
+        return rmq.rmq_query(self.table, i0, i1)
+
+    # One array per level
+    def arrays(self):
+        return self.table
+
+    @staticmethod
+    def from_arrays(arrays):
+        rmq_backend = SparseRmq.__new__(SparseRmq)
+        rmq_backend.table = arrays
+        return rmq_backend
+
+# Block decomposition (search/rmq.py linear-space structure), O(n) space,
+# O(1) time per query
+# Memory: the tour, a mask per value, and a sparse table of the 2n / log2(2n)
+# block minima, about 3 x 20M values for 10M vertices
+class BlockRmq:
+
+    def __init__(self, table):
+        self.structure = rmq.rmq_linear_build(table)
+
+    def query(self, i0, i1):
+        return rmq.rmq_linear_query(self.structure, i0, i1)
+
+    # Values, in-block masks, then the block sparse table levels
+    def arrays(self):
+        table, block_size, mask, block_table = self.structure
+        return [table, mask] + block_table
+
+    @staticmethod
+    def from_arrays(arrays):
+        rmq_backend = BlockRmq.__new__(BlockRmq)
+        table, mask = arrays[:2]
+        block_size = max(1, rmq.log2(len(table)))
+        rmq_backend.structure = table, block_size, mask, arrays[2:]
+        return rmq_backend
+
+rmq_backends = [NaiveRmq, SparseRmq, BlockRmq]
 
 # Undirected graph, possibly an unrooted tree
 class Graph:
@@ -16,6 +99,19 @@ class Graph:
         self.edges[u].append(v)
         self.edges[v].append(u)
 
+# Children of each vertex of a loaded tree, stored consecutively
+class CsrChildren:
+
+    def __init__(self, first, children):
+        self.first = first
+        self.children = children
+
+    def __len__(self):
+        return len(self.first) - 1
+
+    def __getitem__(self, u):
+        return self.children[self.first[u]:self.first[u + 1]]
+
 # Rooted tree
 class RootedTree:
 
@@ -26,6 +122,8 @@ class RootedTree:
         self.root = root
         self.parent = [None] * self.vertices_count
         self.children = [[] for _ in range(self.vertices_count)]
+        self.depth = None
+        self.ancestor = None
 
     def add_edge(self, u, v):
         assert u >= 0 and u < self.vertices_count
@@ -33,6 +131,72 @@ class RootedTree:
         assert self.parent[v] is None
         self.parent[v] = u
         self.children[u].append(v)
+        self.depth = None
+        self.ancestor = None
+
+    # Computes the depth of each vertex
+    # BFS traversal
+    def build_depth(self):
+        depth = [None] * self.vertices_count
+        depth[self.root] = 0
+        order = [self.root]
+        for u in order:
+            for v in self.children[u]:
+                depth[v] = depth[u] + 1
+                order.append(v)
+        self.depth = depth
+
+    # Prepares the tree for ancestor queries
+    # Binary lifting: ancestor[k][u] is the ancestor 2^k levels above u,
+    # the root being its own parent
+    def build_lifting(self):
+        if self.depth is None:
+            self.build_depth()
+        level = [u if u == self.root else self.parent[u]
+            for u in range(self.vertices_count)]
+        self.ancestor = [level]
+        for k in range(max(self.depth).bit_length() - 1):
+            level = [level[u] for u in level]
+            self.ancestor.append(level)
+
+    # Queries for the ancestor k levels above a vertex, None if there is none
+    def kth_ancestor(self, u, k):
+        assert u >= 0 and u < self.vertices_count
+        assert k >= 0
+        if self.ancestor is None:
+            self.build_lifting()
+        if k > self.depth[u]:
+            return None
+        i = 0
+        while k > 0:
+            if k & 1:
+                u = self.ancestor[i][u]
+            k >>= 1
+            i += 1
+        return u
+
+    # Queries for the lowest common ancestor between two vertices
+    # Lifts the deepest vertex to the depth of the other, then both vertices
+    # together to just below their lowest common ancestor
+    def lowest_common_ancestor(self, u, v):
+        assert u >= 0 and u < self.vertices_count
+        assert v >= 0 and v < self.vertices_count
+        if self.ancestor is None:
+            self.build_lifting()
+        if self.depth[u] < self.depth[v]:
+            u, v = v, u
+        u = self.kth_ancestor(u, self.depth[u] - self.depth[v])
+        if u == v:
+            return u
+        for level in reversed(self.ancestor):
+            if level[u] != level[v]:
+                u, v = level[u], level[v]
+        return self.parent[u]
+
+    # Queries for the number of edges between two vertices
+    def distance(self, u, v):
+        w = self.lowest_common_ancestor(u, v)
+        return self.depth[u] + self.depth[v] - 2 * self.depth[w]
 
     # Creates a rooted tree from an unrooted tree
     # DFS traversal
@@ -51,7 +215,10 @@ class RootedTree:
 
 # Prepares a rooted tree for lowest common ancestor queries
 # DFS traversal, Euler tour technique
-def lca_build(tree):
+# The lowest common ancestor is the vertex discovered first between the
+# occurrences of the two vertices in the Euler tour, found by the RMQ
+# backend, linear-space by default
+def lca_build(tree, rmq_backend=BlockRmq):
     # Vertices arranged in discovery order
     # and index of the occurence of each vertex in the order
     order = []
@@ -74,7 +241,7 @@ def lca_build(tree):
             etr_index[u] = len(etr)
         etr.append(order_index[u])
     # Prepare the ETR for RMQ
-    etr_rmq = rmq_build(etr)
+    etr_rmq = rmq_backend(etr)
     return tree, order, etr_rmq, etr_index
 
 # Queries for the lowest common ancestor between two vertices
@@ -84,49 +251,343 @@ def lca_query(lca_tree, u, v):
     assert v >= 0 and v < tree.vertices_count
     i0, i1 = etr_index[u], etr_index[v]
     if i0 > i1: i0, i1 = i1, i0
-    return order[rmq_query(etr_rmq, i0, i1)]
+    return order[etr_rmq.query(i0, i1)]
+
+# Queries for the lowest common ancestors of many pairs of vertices
+# (arrays us and vs), returns a NumPy array
+# Tarjan's offline algorithm: a single DFS, each finished vertex joins the
+# set of its parent in a union-find structure, the lowest common ancestor
+# of a finished vertex and the current one is the root of its set
+# No preparation of the tree, O(n + q) space
+def lca_offline(tree, us, vs):
+    if numpy is None:
+        raise ImportError('offline LCA requires numpy')
+    n = tree.vertices_count
+    us = numpy.asarray(us, dtype=numpy.int64)
+    vs = numpy.asarray(vs, dtype=numpy.int64)
+    assert us.shape == vs.shape and us.ndim == 1
+    assert len(us) == 0 or (us.min() >= 0 and us.max() < n)
+    assert len(vs) == 0 or (vs.min() >= 0 and vs.max() < n)
+    # Queries of each vertex, sorted by vertex
+    queries_count = len(us)
+    endpoints = numpy.concatenate((us, vs))
+    by_vertex = numpy.argsort(endpoints, kind='stable')
+    first = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(endpoints, minlength=n), out=first[1:])
+    first = first.tolist()
+    others = numpy.concatenate((vs, us))[by_vertex].tolist()
+    query_ids = (by_vertex % max(1, queries_count)).tolist()
+    # DFS, vertices finish in post-order
+    answers = [0] * queries_count
+    component = list(range(n))
+    finished = [False] * n
+    children = tree.children
+    todo = [(tree.root, 0)]
+    while len(todo) > 0:
+        u, i = todo.pop()
+        if i < len(children[u]):
+            todo.append((u, i + 1))
+            todo.append((children[u][i], 0))
+            continue
+        finished[u] = True
+        for k in range(first[u], first[u + 1]):
+            w = others[k]
+            if finished[w]:
+                # Find the root of the set, with path halving
+                while component[w] != w:
+                    component[w] = component[component[w]]
+                    w = component[w]
+                answers[query_ids[k]] = w
+        if u != tree.root:
+            component[u] = tree.parent[u]
+    return numpy.array(answers, dtype=numpy.int64)
 
 # Queries for the path between two vertices
+# Fills the path from both ends, its length is known from the depths
 def find_path(lca_tree, u, v):
     tree = lca_tree[0]
     assert u >= 0 and u < tree.vertices_count
     assert v >= 0 and v < tree.vertices_count
-    def parent_path(u, v):
-        while u != v:
-            yield u
-            u = tree.parent[u]
+    if tree.depth is None:
+        tree.build_depth()
     w = lca_query(lca_tree, u, v)
-    path_uw = list(parent_path(u, w))
-    path_wv = list(reversed(list(parent_path(v, w))))
-    return path_uw + [w] + path_wv
+    i = tree.depth[u] - tree.depth[w]
+    j = i + tree.depth[v] - tree.depth[w]
+    path = [w] * (j + 1)
+    for k in range(i):
+        path[k] = u
+        u = tree.parent[u]
+    for k in range(j, i, -1):
+        path[k] = v
+        v = tree.parent[v]
+    return path
+
+# Aggregates of weights along paths of a rooted tree, with an associative
+# combining function such as min, max or operator.add
+# Vertex weights, or edge weights given at the child end of each edge
+# Binary lifting: aggregate[k][u] combines the weights of u and the
+# 2^k - 1 vertices above it
+class PathAggregate:
+
+    def __init__(self, tree, weights, combine=min, edges=False):
+        assert len(weights) == tree.vertices_count
+        if tree.ancestor is None:
+            tree.build_lifting()
+        self.tree = tree
+        self.weights = weights
+        self.combine = combine
+        self.edges = edges
+        level = list(weights)
+        self.aggregate = [level]
+        for ancestor in tree.ancestor[:-1]:
+            level = list(map(combine, level, (level[u] for u in ancestor)))
+            self.aggregate.append(level)
+
+    # Queries for the aggregate of the weights on the path between two
+    # vertices, None for an empty path
+    def query(self, u, v):
+        tree = self.tree
+        assert u >= 0 and u < tree.vertices_count
+        assert v >= 0 and v < tree.vertices_count
+        combine = self.combine
+        values = []
+        if tree.depth[u] < tree.depth[v]:
+            u, v = v, u
+        k = tree.depth[u] - tree.depth[v]
+        i = 0
+        while k > 0:
+            if k & 1:
+                values.append(self.aggregate[i][u])
+                u = tree.ancestor[i][u]
+            k >>= 1
+            i += 1
+        if u != v:
+            for i in reversed(range(len(tree.ancestor))):
+                if tree.ancestor[i][u] != tree.ancestor[i][v]:
+                    values.append(self.aggregate[i][u])
+                    values.append(self.aggregate[i][v])
+                    u, v = tree.ancestor[i][u], tree.ancestor[i][v]
+            values.append(self.weights[u])
+            values.append(self.weights[v])
+            u = tree.parent[u]
+        if not self.edges:
+            values.append(self.weights[u])
+        if len(values) == 0:
+            return None
+        return functools.reduce(combine, values)
+
+# Binary LCA index files
+# Header: magic, vertices count, root, RMQ backend, arrays count
+# then the length of each array and the arrays, all as signed 64-bit
+# integers in native byte order
+# Arrays: parent (-1 for the root), depth, first child index, children,
+# discovery order, ETR index, then the arrays of the RMQ backend
+lca_magic = b'LCAINDX1'
+
+# Writes a prepared tree
+def lca_save(lca_tree, path):
+    tree, order, etr_rmq, etr_index = lca_tree
+    if tree.depth is None:
+        tree.build_depth()
+    parent = [-1 if u is None else u for u in tree.parent]
+    child_first = [0]
+    children = []
+    for u in range(tree.vertices_count):
+        children.extend(tree.children[u])
+        child_first.append(len(children))
+    arrays = [parent, tree.depth, child_first, children, order, etr_index]
+    arrays.extend(etr_rmq.arrays())
+    header = [tree.vertices_count, tree.root,
+        rmq_backends.index(type(etr_rmq)), len(arrays)]
+    header.extend(len(values) for values in arrays)
+    with open(path, 'wb') as f:
+        f.write(lca_magic)
+        array.array('q', header).tofile(f)
+        for values in arrays:
+            if not isinstance(values, array.array):
+                values = array.array('q', values)
+            f.write(memoryview(values).cast('B'))
+
+# Maps a prepared tree into memory, read-only and without per-vertex work
+# Processes mapping the same file share its pages
+# The tree cannot change, its root has -1 for parent
+def lca_load(path):
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(lca_magic)] != lca_magic:
+        raise ValueError('not an LCA index file')
+    values = memoryview(mapping)[len(lca_magic):].cast('q')
+    vertices_count, root, backend, arrays_count = values[:4]
+    lengths = values[4:4 + arrays_count]
+    if len(values) != 4 + arrays_count + sum(lengths):
+        raise ValueError('truncated LCA index file')
+    arrays = []
+    offset = 4 + arrays_count
+    for length in lengths:
+        arrays.append(values[offset:offset + length])
+        offset += length
+    parent, depth, child_first, children, order, etr_index = arrays[:6]
+    tree = RootedTree.__new__(RootedTree)
+    tree.vertices_count = vertices_count
+    tree.root = root
+    tree.parent = parent
+    tree.children = CsrChildren(child_first, children)
+    tree.depth = depth
+    tree.ancestor = None
+    etr_rmq = rmq_backends[backend].from_arrays(arrays[6:])
+    return tree, order, etr_rmq, etr_index
+
+
+if __name__ == "__main__":
+
+    ### Tests for correctness ###
+
+    g = Graph(6)
+    g.add_edge(0, 1)
+    g.add_edge(0, 2)
+    g.add_edge(1, 3)
+    g.add_edge(1, 4)
+    g.add_edge(2, 5)
+
+    # Root the tree at 0
+    t = RootedTree.from_graph(g, 0)
+    lca_t = lca_build(t)
+
+    assert lca_query(lca_t, 0, 0) == 0
+    assert lca_query(lca_t, 0, 5) == 0
+    assert lca_query(lca_t, 3, 5) == 0
+    assert lca_query(lca_t, 3, 4) == 1
+
+    assert find_path(lca_t, 3, 4) == [3, 1, 4]
+    assert find_path(lca_t, 3, 5) == [3, 1, 0, 2, 5]
+
+    # Root the tree at 2
+    t = RootedTree.from_graph(g, 2)
+    lca_t = lca_build(t)
+
+    assert lca_query(lca_t, 3, 4) == 1
+    assert lca_query(lca_t, 3, 5) == 2
+
+    assert find_path(lca_t, 3, 4) == [3, 1, 4]
+    assert find_path(lca_t, 3, 5) == [3, 1, 0, 2, 5]
+
+    ### Randomized tests (RMQ backends) ###
+
+    import random
+
+    vertices_count = 500
+    t = RootedTree(vertices_count)
+    for v in range(1, vertices_count):
+        t.add_edge(random.randrange(v), v)
+
+    def depth(u):
+        return 0 if u == t.root else 1 + depth(t.parent[u])
+
+    def naive_lca(u, v):
+        while depth(u) > depth(v):
+            u = t.parent[u]
+        while depth(v) > depth(u):
+            v = t.parent[v]
+        while u != v:
+            u, v = t.parent[u], t.parent[v]
+        return u
+
+    lca_trees = [lca_build(t, rmq_backend)
+        for rmq_backend in (NaiveRmq, SparseRmq, BlockRmq)]
+    for i in range(1000):
+        u = random.randrange(vertices_count)
+        v = random.randrange(vertices_count)
+        w = naive_lca(u, v)
+        for lca_t in lca_trees:
+            assert lca_query(lca_t, u, v) == w
+
+    ### Randomized tests (offline queries) ###
+
+    if numpy is not None:
+        us = [random.randrange(vertices_count) for i in range(1000)]
+        vs = [random.randrange(vertices_count) for i in range(1000)]
+        answers = lca_offline(t, us, vs)
+        assert answers.tolist() == [naive_lca(u, v) for u, v in zip(us, vs)]
+        assert lca_offline(t, [], []).tolist() == []
+    else:
+        try:
+            lca_offline(t, [1], [2])
+            assert False
+        except ImportError:
+            pass
+
+    ### Randomized tests (binary lifting) ###
 
-### Tests for correctness ###
+    import operator
 
-g = Graph(6)
-g.add_edge(0, 1)
-g.add_edge(0, 2)
-g.add_edge(1, 3)
-g.add_edge(1, 4)
-g.add_edge(2, 5)
+    for u in range(vertices_count):
+        assert t.kth_ancestor(u, depth(u)) == t.root
+        assert t.kth_ancestor(u, depth(u) + 1) is None
+        if u != t.root:
+            assert t.kth_ancestor(u, 1) == t.parent[u]
 
-# Root the tree at 0
-t = RootedTree.from_graph(g, 0)
-lca_t = lca_build(t)
+    weights = [random.randint(-100, 100) for u in range(vertices_count)]
+    aggregates = [(combine, edges, PathAggregate(t, weights, combine, edges))
+        for combine in (min, max, operator.add) for edges in (False, True)]
+    lca_t = lca_build(t)
+    for i in range(1000):
+        u = random.randrange(vertices_count)
+        v = random.randrange(vertices_count)
+        w = naive_lca(u, v)
+        assert t.lowest_common_ancestor(u, v) == w
+        assert t.distance(u, v) == depth(u) + depth(v) - 2 * depth(w)
+        path = find_path(lca_t, u, v)
+        assert path[0] == u and path[-1] == v and w in path
+        assert len(path) == t.distance(u, v) + 1
+        for x, y in zip(path, path[1:]):
+            assert t.parent[x] == y or t.parent[y] == x
+        for combine, edges, aggregate in aggregates:
+            path_weights = [weights[x] for x in path]
+            if edges:
+                path_weights = [weights[x] for x in path if x != w]
+            expected = functools.reduce(combine, path_weights) \
+                if len(path_weights) > 0 else None
+            assert aggregate.query(u, v) == expected
 
-assert lca_query(lca_t, 0, 0) == 0
-assert lca_query(lca_t, 0, 5) == 0
-assert lca_query(lca_t, 3, 5) == 0
-assert lca_query(lca_t, 3, 4) == 1
+    # Deep chain
+    vertices_count = 100000
+    chain = RootedTree(vertices_count)
+    for v in range(1, vertices_count):
+        chain.add_edge(v - 1, v)
+    assert chain.kth_ancestor(vertices_count - 1, vertices_count - 1) == 0
+    assert chain.distance(10, vertices_count - 1) == vertices_count - 11
+    assert PathAggregate(chain, list(range(vertices_count)), operator.add) \
+        .query(0, vertices_count - 1) \
+        == vertices_count * (vertices_count - 1) // 2
 
-assert find_path(lca_t, 3, 4) == [3, 1, 4]
-assert find_path(lca_t, 3, 5) == [3, 1, 0, 2, 5]
+    ### Randomized tests (saved index) ###
 
-# Root the tree at 2
-t = RootedTree.from_graph(g, 2)
-lca_t = lca_build(t)
+    import tempfile
 
-assert lca_query(lca_t, 3, 4) == 1
-assert lca_query(lca_t, 3, 5) == 2
+    vertices_count = 500
+    t = RootedTree(vertices_count)
+    for v in range(1, vertices_count):
+        t.add_edge(random.randrange(v), v)
 
-assert find_path(lca_t, 3, 4) == [3, 1, 4]
-assert find_path(lca_t, 3, 5) == [3, 1, 0, 2, 5]
+    with tempfile.TemporaryDirectory() as directory:
+        for rmq_backend in rmq_backends:
+            lca_t = lca_build(t, rmq_backend)
+            path = os.path.join(directory, 'lca.bin')
+            lca_save(lca_t, path)
+            loaded_lca_t = lca_load(path)
+            loaded_t = loaded_lca_t[0]
+            for i in range(300):
+                u = random.randrange(vertices_count)
+                v = random.randrange(vertices_count)
+                assert lca_query(loaded_lca_t, u, v) == lca_query(lca_t, u, v)
+                assert find_path(loaded_lca_t, u, v) == find_path(lca_t, u, v)
+                assert loaded_t.distance(u, v) == t.distance(u, v)
+            assert list(loaded_t.children[0]) == t.children[0]
+            if numpy is not None:
+                assert lca_offline(loaded_t, [1, 2], [3, 4]).tolist() \
+                    == lca_offline(t, [1, 2], [3, 4]).tolist()
+            try:
+                loaded_t.parent[1] = 0
+                assert False
+            except TypeError:
+                pass
@@ -1,9 +1,68 @@
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Converts values to a NumPy array if NumPy computes with them exactly:
+# integers whose sums all fit in 64 bits
+# Floats only if asked: their sums depend on the order of the additions,
+# which only the walks of the scalar methods keep
+# Returns None otherwise, Python integers have no such limit
+def numpy_array(values, floats=False):
+    if numpy is None:
+        return None
+    if isinstance(values, numpy.ndarray):
+        array = values
+    else:
+        array = numpy.asarray(values)
+        # Integers too large for 64 bits come out as floats
+        if array.dtype.kind == 'f' \
+                and any(isinstance(value, int) for value in values):
+            return None
+    if array.dtype.kind in 'biu':
+        if array.dtype == numpy.uint64:
+            return None
+        # Bound on the absolute value of any sum of the values
+        if numpy.abs(array.astype(numpy.float64)).sum() >= 2 ** 62:
+            return None
+        return array.astype(numpy.int64)
+    if array.dtype.kind == 'f' and floats:
+        return array
+    return None
+
+# Fenwick tree array of the given deltas, in O(n) time
+# Cell i (1-based) sums the deltas in (i - lowbit(i), i], a difference of
+# prefix sums (vectorized, integers only: with floats the difference of two
+# large sums loses the small deltas), or each cell adds itself to its parent
+def fenwick_array(deltas):
+    n = len(deltas)
+    values = numpy_array(deltas)
+    if values is not None:
+        prefix = numpy.concatenate(([0], numpy.cumsum(values)))
+        index = numpy.arange(1, n + 1)
+        return (prefix[index] - prefix[index - (index & -index)]).tolist()
+    array = list(deltas)
+    for index in range(1, n + 1):
+        parent = index + (index & -index)
+        if parent <= n:
+            array[parent - 1] += array[index - 1]
+    return array
+
 class FenwickTree:
 
     def __init__(self, size):
         self.size = size
         self.array = [0] * self.size
 
+    # Creates a tree as if each delta had been added at its index
+    @staticmethod
+    def from_array(deltas):
+        tree = FenwickTree(len(deltas))
+        tree.array = fenwick_array(deltas)
+        return tree
+
     # Adds delta to values at and after index
     def update(self, index, delta):
         assert index >= 0 and index < self.size
@@ -24,14 +83,78 @@ class FenwickTree:
             index -= index & -index
         return value
 
+    # Whether a batch is worth a vectorized pass over the whole tree
+    def vectorize(self, batch_size):
+        return numpy is not None \
+            and batch_size * self.size.bit_length() >= self.size
+
+    # Adds each delta to values at and after its index
+    # Large batches sum the deltas at each index and add the tree of these
+    # sums, O(n) vectorized
+    def update_many(self, indices, deltas):
+        assert len(indices) == len(deltas)
+        assert all(index >= 0 and index < self.size for index in indices)
+        if self.vectorize(len(indices)):
+            array = numpy_array(self.array)
+            values = numpy_array(deltas)
+            if array is not None and values is not None:
+                sums = numpy.zeros(self.size, dtype=numpy.result_type(
+                    array, values))
+                numpy.add.at(sums, numpy.asarray(indices, dtype=numpy.int64),
+                    values)
+                self.array = (array + fenwick_array(sums)).tolist()
+                return
+        array, size = self.array, self.size
+        for index, delta in zip(indices, deltas):
+            index += 1
+            while index <= size:
+                array[index - 1] += delta
+                index += index & -index
+
+    # Returns the values at the indices
+    # Large batches walk up from all the indices together, O(m log n)
+    # vectorized
+    def query_many(self, indices):
+        assert all(index >= 0 and index < self.size for index in indices)
+        if self.vectorize(len(indices)):
+            # Same additions in the same order as query, exact for floats
+            array = numpy_array(self.array, floats=True)
+            if array is not None:
+                array = numpy.concatenate(([0], array))
+                index = numpy.asarray(indices, dtype=numpy.int64) + 1
+                values = numpy.zeros(len(index), dtype=array.dtype)
+                for k in range(self.size.bit_length()):
+                    values += array[index]
+                    index -= index & -index
+                return values.tolist()
+        array = self.array
+        values = []
+        for index in indices:
+            index += 1
+            value = 0
+            while index != 0:
+                value += array[index - 1]
+                index -= index & -index
+            values.append(value)
+        return values
+
 class UpdateIndexQueryRange:
 
     def __init__(self, size):
         self.tree = FenwickTree(size)
 
+    @staticmethod
+    def from_array(values):
+        tree = UpdateIndexQueryRange(0)
+        tree.tree = FenwickTree.from_array(values)
+        return tree
+
     def update_index(self, index, delta):
         self.tree.update(index, delta)
 
+    def update_index_many(self, indices, deltas):
+        self.tree.update_many(indices, deltas)
+
     def query_range(self, index1, index2):
         def query(index):
             if index < 0:
@@ -41,11 +164,30 @@ class UpdateIndexQueryRange:
             return self.tree.query(index)
         return query(index2) - query(index1 - 1)
 
+    def query_range_many(self, index1s, index2s):
+        # Prefix sums up to index2 and index1 - 1, clamped
+        size = self.tree.size
+        indices = [min(index, size - 1)
+            for index in itertools.chain(index2s, (i - 1 for i in index1s))]
+        values = self.tree.query_many([max(index, 0) for index in indices])
+        values = [0 if index < 0 else value
+            for index, value in zip(indices, values)]
+        count = len(values) // 2
+        return [values[i] - values[count + i] for i in range(count)]
+
 class UpdateRangeQueryIndex:
 
     def __init__(self, size):
         self.tree = FenwickTree(size)
 
+    # The values are the sums of the differences with the previous values
+    @staticmethod
+    def from_array(values):
+        tree = UpdateRangeQueryIndex(0)
+        tree.tree = FenwickTree.from_array([value - previous
+            for value, previous in zip(values, itertools.chain([0], values))])
+        return tree
+
     def update_range(self, index1, index2, delta):
         def update(index, delta):
             if index >= self.tree.size:
@@ -56,66 +198,201 @@ class UpdateRangeQueryIndex:
         update(index1, delta)
         update(index2 + 1, -delta)
 
+    def update_range_many(self, index1s, index2s, deltas):
+        indices = []
+        range_deltas = []
+        for index1, index2, delta in zip(index1s, index2s, deltas):
+            if index1 < self.tree.size:
+                indices.append(max(index1, 0))
+                range_deltas.append(delta)
+            if index2 + 1 < self.tree.size:
+                indices.append(max(index2 + 1, 0))
+                range_deltas.append(-delta)
+        self.tree.update_many(indices, range_deltas)
+
     def query_index(self, index):
         return self.tree.query(index)
 
-tree_len = 1000
-
-# Data structure test
-
-t1 = FenwickTree(tree_len)
-assert t1.query(0) == 0
-assert t1.query(500) == 0
-assert t1.query(999) == 0
-
-t1.update(500, 10)
-assert t1.query(0) == 0
-assert t1.query(499) == 0
-assert t1.query(500) == 10
-assert t1.query(501) == 10
-assert t1.query(999) == 10
-
-t1.update(0, 5)
-assert t1.query(0) == 5
-assert t1.query(1) == 5
-assert t1.query(500) == 15
-assert t1.query(999) == 15
-
-t1.update(999, 20)
-assert t1.query(0) == 5
-assert t1.query(500) == 15
-assert t1.query(998) == 15
-assert t1.query(999) == 35
-
-# First use case test
-
-t2 = UpdateIndexQueryRange(tree_len)
-
-t2.update_index(0, 1)
-t2.update_index(500, 1)
-t2.update_index(999, 1)
-
-assert t2.query_range(0, 500) == 2
-assert t2.query_range(1, 499) == 0
-assert t2.query_range(500, 999) == 2
-assert t2.query_range(501, 998) == 0
-assert t2.query_range(-999, -1) == 0
-assert t2.query_range(-999, 0) == 1
-assert t2.query_range(1000, 9999) == 0
-assert t2.query_range(999, 9999) == 1
-assert t2.query_range(-999, 9999) == 3
-
-# Second use case test
-
-t3 = UpdateRangeQueryIndex(tree_len)
-
-t3.update_range(0, 999, 5)
-t3.update_range(-999, 100, 25)
-t3.update_range(900, 9999, 50)
-
-assert t3.query_index(0) == 30
-assert t3.query_index(100) == 30
-assert t3.query_index(101) == 5
-assert t3.query_index(899) == 5
-assert t3.query_index(900) == 55
-assert t3.query_index(999) == 55
+    def query_index_many(self, indices):
+        return self.tree.query_many(indices)
+
+# Range updates and range queries with two trees
+# Adding delta to the values in [index1, index2] adds
+# delta * (index + 1 - index1) to the sums up to an index in the range, and
+# delta * (index2 + 1 - index1) after it: the first tree holds the deltas,
+# multiplied by index + 1 when querying, the second one the corrections
+class UpdateRangeQueryRange:
+
+    def __init__(self, size):
+        self.tree1 = FenwickTree(size)
+        self.tree2 = FenwickTree(size)
+
+    def update_range(self, index1, index2, delta):
+        def update(index, delta):
+            if index >= self.tree1.size:
+                return
+            elif index < 0:
+                index = 0
+            self.tree1.update(index, delta)
+            self.tree2.update(index, delta * index)
+        index1 = max(index1, 0)
+        update(index1, delta)
+        update(index2 + 1, -delta)
+
+    def query_range(self, index1, index2):
+        def query(index):
+            if index < 0:
+                return 0
+            elif index >= self.tree1.size:
+                index = self.tree1.size - 1
+            return self.tree1.query(index) * (index + 1) \
+                - self.tree2.query(index)
+        return query(index2) - query(index1 - 1)
+
+
+if __name__ == "__main__":
+
+    tree_len = 1000
+
+    # Data structure test
+
+    t1 = FenwickTree(tree_len)
+    assert t1.query(0) == 0
+    assert t1.query(500) == 0
+    assert t1.query(999) == 0
+
+    t1.update(500, 10)
+    assert t1.query(0) == 0
+    assert t1.query(499) == 0
+    assert t1.query(500) == 10
+    assert t1.query(501) == 10
+    assert t1.query(999) == 10
+
+    t1.update(0, 5)
+    assert t1.query(0) == 5
+    assert t1.query(1) == 5
+    assert t1.query(500) == 15
+    assert t1.query(999) == 15
+
+    t1.update(999, 20)
+    assert t1.query(0) == 5
+    assert t1.query(500) == 15
+    assert t1.query(998) == 15
+    assert t1.query(999) == 35
+
+    # First use case test
+
+    t2 = UpdateIndexQueryRange(tree_len)
+
+    t2.update_index(0, 1)
+    t2.update_index(500, 1)
+    t2.update_index(999, 1)
+
+    assert t2.query_range(0, 500) == 2
+    assert t2.query_range(1, 499) == 0
+    assert t2.query_range(500, 999) == 2
+    assert t2.query_range(501, 998) == 0
+    assert t2.query_range(-999, -1) == 0
+    assert t2.query_range(-999, 0) == 1
+    assert t2.query_range(1000, 9999) == 0
+    assert t2.query_range(999, 9999) == 1
+    assert t2.query_range(-999, 9999) == 3
+
+    # Second use case test
+
+    t3 = UpdateRangeQueryIndex(tree_len)
+
+    t3.update_range(0, 999, 5)
+    t3.update_range(-999, 100, 25)
+    t3.update_range(900, 9999, 50)
+
+    assert t3.query_index(0) == 30
+    assert t3.query_index(100) == 30
+    assert t3.query_index(101) == 5
+    assert t3.query_index(899) == 5
+    assert t3.query_index(900) == 55
+    assert t3.query_index(999) == 55
+
+    # Third use case test
+
+    t4 = UpdateRangeQueryRange(tree_len)
+
+    t4.update_range(0, 999, 5)
+    t4.update_range(-999, 100, 25)
+    t4.update_range(900, 9999, 50)
+
+    assert t4.query_range(0, 0) == 30
+    assert t4.query_range(0, 100) == 30 * 101
+    assert t4.query_range(101, 899) == 5 * 799
+    assert t4.query_range(100, 101) == 35
+    assert t4.query_range(899, 900) == 60
+    assert t4.query_range(-999, 9999) == 5 * 1000 + 25 * 101 + 50 * 100
+    assert t4.query_range(1000, 9999) == 0
+
+    # Bulk construction and batches test
+
+    import random
+
+    values = [random.randint(-100, 100) for i in range(tree_len)]
+    t5 = FenwickTree(tree_len)
+    for index, value in enumerate(values):
+        t5.update(index, value)
+    assert FenwickTree.from_array(values).array == t5.array
+
+    t6 = UpdateIndexQueryRange.from_array(values)
+    t7 = UpdateRangeQueryIndex.from_array(values)
+    values6, values7 = list(values), list(values)
+    for batch_size in (10, 1000):
+        indices = [random.randrange(tree_len) for i in range(batch_size)]
+        deltas = [random.randint(-100, 100) for i in range(batch_size)]
+        t6.update_index_many(indices, deltas)
+        for index, delta in zip(indices, deltas):
+            values6[index] += delta
+        ranges = [sorted((random.randrange(-10, tree_len + 10),
+            random.randrange(-10, tree_len + 10))) for i in range(batch_size)]
+        index1s = [index1 for index1, index2 in ranges]
+        index2s = [index2 for index1, index2 in ranges]
+        assert t6.query_range_many(index1s, index2s) \
+            == [t6.query_range(index1, index2) for index1, index2 in ranges]
+        assert t6.query_range_many(index1s, index2s) == [
+            sum(values6[max(index1, 0):max(index2 + 1, 0)])
+            for index1, index2 in ranges]
+
+        t7.update_range_many(index1s, index2s, deltas)
+        for (index1, index2), delta in zip(ranges, deltas):
+            for index in range(max(index1, 0), min(index2 + 1, tree_len)):
+                values7[index] += delta
+        indices = list(range(tree_len))
+        assert t7.query_index_many(indices) == values7
+        assert t7.query_index_many(indices[:10]) == values7[:10]
+
+    # Large integers, beyond 64 bits for NumPy
+    t9 = FenwickTree.from_array([2 ** 62, 2 ** 62, -2 ** 62, 5])
+    assert t9.array == [2 ** 62, 2 ** 63, -2 ** 62, 2 ** 62 + 5]
+    assert t9.query(2) == 2 ** 62
+    assert FenwickTree.from_array([2 ** 63, -1]).array \
+        == [2 ** 63, 2 ** 63 - 1]
+    t9.update_many([0, 1, 2, 3], [2 ** 62] * 4)
+    assert t9.query_many([0, 1, 2, 3]) \
+        == [2 ** 63, 2 ** 64, 2 ** 64, 2 ** 64 + 2 ** 62 + 5]
+
+    # Floats of mixed magnitude, each cell sums its own deltas only: a
+    # difference of large prefix sums would lose the small ones
+    a = [1e16] + [1.0] * 7
+    t10 = FenwickTree.from_array(a)
+    assert t10.array[0::2] == a[0::2]
+    assert t10.array[5] == 2.0
+    assert UpdateIndexQueryRange.from_array(a).tree.array == t10.array
+    assert t10.query_many(list(range(len(a)))) \
+        == [t10.query(index) for index in range(len(a))]
+
+    # No NumPy
+    numpy, numpy_module = None, numpy
+    assert FenwickTree.from_array(a).array == t10.array
+    assert FenwickTree.from_array(values).array \
+        == UpdateIndexQueryRange.from_array(values).tree.array
+    t8 = FenwickTree.from_array(values)
+    t8.update_many(indices, values)
+    assert t8.query_many(indices) \
+        == [2 * value for value in itertools.accumulate(values)]
+    numpy = numpy_module
@@ -1,24 +1,20 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # floor(log2(n))
 def log2(n):
     assert n > 0
     return n.bit_length() - 1
 
-assert log2(1) == 0
-assert log2(2) == 1
-assert log2(255) == 7
-assert log2(256) == 8
-
 # Builds the RMQ sparse table in O(n log n) time/space
 def rmq_build(a):
     assert len(a) > 0
     table = [a]
     for k in range(log2(len(a))):
-        table.append([])
         length = 1 << k
-        for i in range(len(table[k]) - length):
-            table[k + 1].append(min(
-                table[k][i],
-                table[k][i + length]))
+        table.append(list(map(min, table[k], table[k][length:])))
     return table
 
 # Queries the RMQ sparse table in O(1) time
@@ -33,14 +29,187 @@ def rmq_query(table, i0, i1):
         table[k][i0],
         table[k][i0 + query_length - length])
 
-# Tests
+# Builds a linear-space RMQ structure in O(n) time/space
+# Blocks of log(n) values, a sparse table of the block minima, and for
+# each index a bitmask of the positions of its block which are the minimum
+# of a range ending at the index (bit j for j positions before): the
+# monotonic stack of the block after pushing the index
+def rmq_linear_build(a):
+    assert len(a) > 0
+    n = len(a)
+    block_size = max(1, log2(n))
+    mask = [0] * n
+    block_min = []
+    for start in range(0, n, block_size):
+        stack = 0
+        for i in range(start, min(start + block_size, n)):
+            stack <<= 1
+            # Pop the greater values, the top of the stack is the lowest bit
+            while stack != 0 and a[i - (stack & -stack).bit_length() + 1] > a[i]:
+                stack &= stack - 1
+            stack |= 1
+            mask[i] = stack
+        block_min.append(a[i - stack.bit_length() + 1])
+    return a, block_size, mask, rmq_build(block_min)
+
+# Queries the linear-space RMQ structure in O(1) time
+# Within a block, the minimum of [i0, i1] is the deepest position of the
+# stack of i1 which is not before i0
+def rmq_linear_query(structure, i0, i1):
+    a, block_size, mask, block_table = structure
+    assert i0 >= 0 and i1 >= 0
+    assert i0 < len(a) and i1 < len(a)
+    assert i0 <= i1
+    def block_query(i0, i1):
+        stack = mask[i1] & ((1 << (i1 - i0 + 1)) - 1)
+        return a[i1 - stack.bit_length() + 1]
+    b0, b1 = i0 // block_size, i1 // block_size
+    if b0 == b1:
+        return block_query(i0, i1)
+    value = min(block_query(i0, (b0 + 1) * block_size - 1),
+        block_query(b1 * block_size, i1))
+    if b0 + 1 < b1:
+        value = min(value, rmq_query(block_table, b0 + 1, b1 - 1))
+    return value
+
+# Sparse table in a 2-D NumPy array, for any idempotent operator given as
+# a NumPy ufunc (minimum, maximum, gcd, bitwise_and, bitwise_or...)
+# Row k holds the operator applied to the 2^k values from each index,
+# built with one vectorized operation per level
+# With indices, the rows hold the index of the value selected instead
+# (leftmost on ties), only for selecting operators (minimum, maximum)
+class SparseTable:
+
+    selecting = ('minimum', 'maximum', 'fmin', 'fmax')
+
+    def __init__(self, values, operator=None, indices=False):
+        if numpy is None:
+            raise ImportError('SparseTable requires numpy')
+        self.values = values = numpy.asarray(values)
+        assert values.ndim == 1 and len(values) > 0
+        self.operator = operator = \
+            numpy.minimum if operator is None else operator
+        self.indices = indices
+        n = len(values)
+        if indices:
+            if operator.__name__ not in SparseTable.selecting:
+                raise ValueError('indices require a selecting operator')
+            dtype = numpy.int32 if n < 2 ** 31 else numpy.int64
+            self.table = numpy.empty((log2(n) + 1, n), dtype=dtype)
+            self.table[0] = numpy.arange(n, dtype=dtype)
+        else:
+            self.table = numpy.empty((log2(n) + 1, n), dtype=values.dtype)
+            self.table[0] = values
+        for k in range(log2(n)):
+            length = 1 << k
+            m = n - 2 * length + 1
+            self.table[k + 1, m:] = self.table[k, m:]
+            self.table[k + 1, :m] = self.combine(
+                self.table[k, :m], self.table[k, length:length + m])
+
+    # Applies the operator to two rows of the table
+    def combine(self, a, b):
+        if not self.indices:
+            return self.operator(a, b)
+        value_a = self.values[a]
+        return numpy.where(
+            self.operator(value_a, self.values[b]) == value_a, a, b)
+
+    # Queries for the ranges [i0s[i], i1s[i]], returns an array
+    # The values, or their indices if the table holds indices
+    def query_many(self, i0s, i1s):
+        i0s = numpy.asarray(i0s)
+        i1s = numpy.asarray(i1s)
+        assert numpy.all(i0s >= 0) and numpy.all(i1s < len(self.values))
+        assert numpy.all(i0s <= i1s)
+        # floor(log2(length)), frexp returns length = m * 2^e, 0.5 <= m < 1
+        k = numpy.frexp(i1s - i0s + 1)[1] - 1
+        return self.combine(self.table[k, i0s],
+            self.table[k, i1s - (1 << k) + 1])
+
+    def query(self, i0, i1):
+        return self.query_many([i0], [i1])[0].item()
+
+    # Queries for the values of the ranges [i0s[i], i1s[i]], returns an array
+    def values_many(self, i0s, i1s):
+        result = self.query_many(i0s, i1s)
+        return self.values[result] if self.indices else result
+
+
+if __name__ == "__main__":
+
+    assert log2(1) == 0
+    assert log2(2) == 1
+    assert log2(255) == 7
+    assert log2(256) == 8
+
+    # Tests
+
+    a = [5, 8, 4, 2, 12, 50, 6, 7, 7, 3]
+    table = rmq_build(a)
+    assert rmq_query(table, 0, 0) == min(a[0:1])
+    assert rmq_query(table, 0, 9) == min(a[0:10])
+    assert rmq_query(table, 6, 9) == min(a[6:10])
+
+    a = ['1']
+    table = rmq_build(a)
+    assert rmq_query(table, 0, 0) == min(a[0:1])
+
+    # Tests (linear space)
+
+    a = [5, 8, 4, 2, 12, 50, 6, 7, 7, 3]
+    structure = rmq_linear_build(a)
+    for i0 in range(len(a)):
+        for i1 in range(i0, len(a)):
+            assert rmq_linear_query(structure, i0, i1) == min(a[i0:i1+1])
+
+    a = ['1']
+    structure = rmq_linear_build(a)
+    assert rmq_linear_query(structure, 0, 0) == min(a[0:1])
+
+    # Tests (NumPy sparse table)
+
+    import functools
+    import math
+    import operator
+    import random
+
+    if numpy is not None:
+
+        a = [random.randint(0, 1000) for i in range(1000)]
+        ranges = [sorted((random.randrange(len(a)), random.randrange(len(a))))
+            for i in range(1000)]
+        i0s = [i0 for i0, i1 in ranges]
+        i1s = [i1 for i0, i1 in ranges]
+
+        table = SparseTable(a)
+        assert table.query_many(i0s, i1s).tolist() \
+            == [min(a[i0:i1+1]) for i0, i1 in ranges]
+        assert table.query(6, 9) == min(a[6:10])
+
+        table = SparseTable(a, numpy.gcd)
+        assert table.query_many(i0s, i1s).tolist() \
+            == [functools.reduce(math.gcd, a[i0:i1+1]) for i0, i1 in ranges]
+
+        table = SparseTable(a, numpy.bitwise_or)
+        assert table.query_many(i0s, i1s).tolist() \
+            == [functools.reduce(operator.or_, a[i0:i1+1])
+                for i0, i1 in ranges]
+
+        table = SparseTable(a, numpy.maximum, indices=True)
+        assert table.query_many(i0s, i1s).tolist() \
+            == [a.index(max(a[i0:i1+1]), i0) for i0, i1 in ranges]
+        assert table.values_many(i0s, i1s).tolist() \
+            == [max(a[i0:i1+1]) for i0, i1 in ranges]
+
+        table = SparseTable([3])
+        assert table.query(0, 0) == 3
 
-a = [5, 8, 4, 2, 12, 50, 6, 7, 7, 3]
-table = rmq_build(a)
-assert rmq_query(table, 0, 0) == min(a[0:1])
-assert rmq_query(table, 0, 9) == min(a[0:10])
-assert rmq_query(table, 6, 9) == min(a[6:10])
+    # Randomized tests (linear space)
 
-a = ['1']
-table = rmq_build(a)
-assert rmq_query(table, 0, 0) == min(a[0:1])
+    for n in (1, 2, 3, 17, 100, 1000):
+        a = [random.randint(0, 20) for i in range(n)]
+        structure = rmq_linear_build(a)
+        for i in range(1000):
+            i0, i1 = sorted((random.randrange(n), random.randrange(n)))
+            assert rmq_linear_query(structure, i0, i1) == min(a[i0:i1+1])
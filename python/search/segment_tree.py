@@ -0,0 +1,217 @@
+import operator
+
+# Segment tree with lazy range updates, iterative and array-backed
+# Node k has children 2k and 2k + 1, the leaves start at the size (the
+# smallest power of 2 not below n), padded with the identity
+# Values are combined with an associative operator and its identity
+# (monoid), ranges are inclusive
+# Range updates assign a value and/or add a delta, lazily: a node holds
+# the pending update of its children, pushed down before any access below
+# repeat(value, length) is the operator applied to length copies of value:
+# value * length for sums, value for idempotent operators (min, max)
+# Adding a delta to every value of a range must add repeat(delta, length)
+# to its aggregate, which holds for sums, minima and maxima
+class SegmentTree:
+
+    def __init__(self, values, op, identity,
+            repeat=lambda value, length: value):
+        n = len(values)
+        assert n > 0
+        self.n = n
+        self.op = op
+        self.identity = identity
+        self.repeat = repeat
+        self.log = (n - 1).bit_length()
+        self.size = size = 1 << self.log
+        # Bulk construction, each node from its children
+        self.data = data = [identity] * (2 * size)
+        data[size:size + n] = values
+        for k in range(size - 1, 0, -1):
+            data[k] = op(data[2 * k], data[2 * k + 1])
+        # Pending updates (assign or None, delta), None for no update
+        self.lazy = [None] * size
+
+    # Applies an update to a node, and records it for its children
+    def apply(self, k, update):
+        assign, delta = update
+        length = self.size >> (k.bit_length() - 1)
+        if assign is not None:
+            self.data[k] = self.repeat(assign, length)
+        if delta != 0:
+            self.data[k] += self.repeat(delta, length)
+        if k < self.size:
+            pending = self.lazy[k]
+            if assign is None and pending is not None:
+                # Composition: the pending update then this one
+                update = pending[0], pending[1] + delta
+            self.lazy[k] = update
+
+    # Pushes the pending update of a node down to its children
+    def push(self, k):
+        update = self.lazy[k]
+        if update is not None:
+            self.apply(2 * k, update)
+            self.apply(2 * k + 1, update)
+            self.lazy[k] = None
+
+    # Pushes the pending updates down to the boundaries of [l, r)
+    def push_boundaries(self, l, r):
+        for i in range(self.log, 0, -1):
+            if ((l >> i) << i) != l:
+                self.push(l >> i)
+            if ((r >> i) << i) != r:
+                self.push((r - 1) >> i)
+
+    # Queries for the operator applied to the values in [index1, index2]
+    def query(self, index1, index2):
+        assert index1 >= 0 and index2 < self.n
+        assert index1 <= index2
+        l, r = index1 + self.size, index2 + 1 + self.size
+        self.push_boundaries(l, r)
+        op, data = self.op, self.data
+        left, right = self.identity, self.identity
+        while l < r:
+            if l & 1:
+                left = op(left, data[l])
+                l += 1
+            if r & 1:
+                r -= 1
+                right = op(data[r], right)
+            l >>= 1
+            r >>= 1
+        return op(left, right)
+
+    # Applies an update (assign or None, delta) to [index1, index2]
+    def update(self, index1, index2, update):
+        assert index1 >= 0 and index2 < self.n
+        assert index1 <= index2
+        l, r = index1 + self.size, index2 + 1 + self.size
+        self.push_boundaries(l, r)
+        l0, r0 = l, r
+        while l < r:
+            if l & 1:
+                self.apply(l, update)
+                l += 1
+            if r & 1:
+                r -= 1
+                self.apply(r, update)
+            l >>= 1
+            r >>= 1
+        # Recompute the ancestors of the boundaries
+        op, data = self.op, self.data
+        for i in range(1, self.log + 1):
+            if ((l0 >> i) << i) != l0:
+                k = l0 >> i
+                data[k] = op(data[2 * k], data[2 * k + 1])
+            if ((r0 >> i) << i) != r0:
+                k = (r0 - 1) >> i
+                data[k] = op(data[2 * k], data[2 * k + 1])
+
+    def add(self, index1, index2, delta):
+        self.update(index1, index2, (None, delta))
+
+    def assign(self, index1, index2, value):
+        self.update(index1, index2, (value, 0))
+
+    # Returns the value at index
+    def get(self, index):
+        return self.query(index, index)
+
+    # Batches: one call for many ranges, answers in order
+    def query_many(self, index1s, index2s):
+        query = self.query
+        return [query(index1, index2)
+            for index1, index2 in zip(index1s, index2s)]
+
+    def add_many(self, index1s, index2s, deltas):
+        update = self.update
+        for index1, index2, delta in zip(index1s, index2s, deltas):
+            update(index1, index2, (None, delta))
+
+    def assign_many(self, index1s, index2s, values):
+        update = self.update
+        for index1, index2, value in zip(index1s, index2s, values):
+            update(index1, index2, (value, 0))
+
+def sum_tree(values):
+    return SegmentTree(values, operator.add, 0,
+        lambda value, length: value * length)
+
+def min_tree(values):
+    return SegmentTree(values, min, float('inf'))
+
+def max_tree(values):
+    return SegmentTree(values, max, float('-inf'))
+
+# Tests
+
+t = sum_tree([5, 8, 4, 2, 12, 50, 6, 7, 7, 3])
+assert t.query(0, 9) == 104
+assert t.query(2, 4) == 18
+t.add(1, 3, 10)
+assert t.query(0, 9) == 134
+assert t.query(3, 4) == 24
+t.assign(2, 7, 1)
+assert t.query(0, 9) == 39
+assert t.get(1) == 18
+assert t.get(2) == 1
+
+t = min_tree([5, 8, 4, 2, 12, 50, 6, 7, 7, 3])
+assert t.query(0, 9) == 2
+assert t.query(4, 8) == 6
+t.add(0, 4, 10)
+assert t.query(0, 4) == 12
+assert t.query(0, 9) == 3
+t.assign(9, 9, 100)
+assert t.query(5, 9) == 6
+
+t = max_tree([1])
+t.add(0, 0, 5)
+assert t.query(0, 0) == 6
+
+# Randomized tests
+
+import random
+
+for make_tree, combine in ((sum_tree, sum), (min_tree, min), (max_tree, max)):
+    for n in (1, 2, 3, 10, 100):
+        a = [random.randint(-100, 100) for i in range(n)]
+        t = make_tree(a)
+        for i in range(1000):
+            index1, index2 = sorted((random.randrange(n), random.randrange(n)))
+            operation = random.randrange(3)
+            if operation == 0:
+                assert t.query(index1, index2) == combine(a[index1:index2+1])
+            elif operation == 1:
+                delta = random.randint(-100, 100)
+                t.add(index1, index2, delta)
+                for index in range(index1, index2 + 1):
+                    a[index] += delta
+            else:
+                value = random.randint(-100, 100)
+                t.assign(index1, index2, value)
+                for index in range(index1, index2 + 1):
+                    a[index] = value
+
+# Randomized tests (batches)
+
+n = 100
+a = [random.randint(-100, 100) for i in range(n)]
+t = sum_tree(a)
+ranges = [sorted((random.randrange(n), random.randrange(n)))
+    for i in range(100)]
+index1s = [index1 for index1, index2 in ranges]
+index2s = [index2 for index1, index2 in ranges]
+deltas = [random.randint(-100, 100) for i in range(100)]
+t.add_many(index1s, index2s, deltas)
+for (index1, index2), delta in zip(ranges, deltas):
+    for index in range(index1, index2 + 1):
+        a[index] += delta
+assert t.query_many(index1s, index2s) \
+    == [sum(a[index1:index2+1]) for index1, index2 in ranges]
+t.assign_many(index1s[:10], index2s[:10], deltas[:10])
+for (index1, index2), value in zip(ranges[:10], deltas[:10]):
+    for index in range(index1, index2 + 1):
+        a[index] = value
+assert t.query_many(index1s, index2s) \
+    == [sum(a[index1:index2+1]) for index1, index2 in ranges]
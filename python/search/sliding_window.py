@@ -0,0 +1,131 @@
+import collections
+import itertools
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Minimum or maximum of each window of consecutive values of an iterator
+# Yields one value per full window, O(window) space
+# Monotonic deque: the values which can still be the extremum of a window,
+# with their index, each value enters and leaves once: O(1) amortized
+def sliding_extremum(values, window, better):
+    assert window > 0
+    todo = collections.deque()
+    for index, value in enumerate(values):
+        while len(todo) > 0 and not better(todo[-1][1], value):
+            todo.pop()
+        todo.append((index, value))
+        if todo[0][0] <= index - window:
+            todo.popleft()
+        if index >= window - 1:
+            yield todo[0][1]
+
+def sliding_min(values, window):
+    return sliding_extremum(values, window, operator.lt)
+
+def sliding_max(values, window):
+    return sliding_extremum(values, window, operator.gt)
+
+# Minimum or maximum of each window of consecutive values of an iterator of
+# NumPy chunks
+# Yields an array per chunk, with one value per full window ending in it
+# Keeps the last window - 1 values between chunks
+# Van Herk/Gil-Werman algorithm, vectorized: in blocks of window values,
+# a window is a suffix of a block and a prefix of the next, whose running
+# extrema are accumulated along the blocks
+# Chunks of other than integers or floats (booleans, objects...), without
+# neutral value for the padding, go through the monotonic deque
+def sliding_extremum_chunks(chunks, window, ufunc):
+    assert window > 0
+    carry = None
+    for chunk in chunks:
+        values = numpy.asarray(chunk)
+        if carry is not None:
+            values = numpy.concatenate((carry, values))
+        carry = values[max(0, len(values) - window + 1):].copy()
+        if len(values) < window:
+            yield values[:0]
+            continue
+        if values.dtype.kind not in 'iuf':
+            better = operator.lt if ufunc is numpy.minimum else operator.gt
+            yield numpy.array(list(sliding_extremum(values, window, better)),
+                dtype=values.dtype)
+            continue
+        # Pad with the neutral value to whole blocks
+        if numpy.issubdtype(values.dtype, numpy.integer):
+            info = numpy.iinfo(values.dtype)
+        else:
+            info = numpy.finfo(values.dtype)
+        neutral = info.max if ufunc is numpy.minimum else info.min
+        blocks_count = -(-len(values) // window)
+        blocks = numpy.full(blocks_count * window, neutral,
+            dtype=values.dtype)
+        blocks[:len(values)] = values
+        blocks = blocks.reshape(blocks_count, window)
+        prefix = ufunc.accumulate(blocks, axis=1).ravel()
+        suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+        windows_count = len(values) - window + 1
+        yield ufunc(suffix[:windows_count], prefix[window - 1:len(values)])
+
+def sliding_min_chunks(chunks, window):
+    return sliding_extremum_chunks(chunks, window, numpy.minimum)
+
+def sliding_max_chunks(chunks, window):
+    return sliding_extremum_chunks(chunks, window, numpy.maximum)
+
+# Tests
+
+a = [5, 8, 4, 2, 12, 50, 6, 7, 7, 3]
+assert list(sliding_min(a, 3)) == [4, 2, 2, 2, 6, 6, 6, 3]
+assert list(sliding_max(a, 3)) == [8, 8, 12, 50, 50, 50, 7, 7]
+assert list(sliding_min(a, 1)) == a
+assert list(sliding_min(a, 11)) == []
+assert list(sliding_min(iter(a), 10)) == [2]
+
+# Unbounded iterator
+assert list(itertools.islice(sliding_max(itertools.count(), 5), 3)) \
+    == [4, 5, 6]
+
+if numpy is not None:
+    chunks = [numpy.array(a[0:4]), numpy.array(a[4:5]), numpy.array(a[5:10])]
+    results = list(sliding_min_chunks(chunks, 3))
+    assert [result.tolist() for result in results] \
+        == [[4, 2], [2], [2, 6, 6, 6, 3]]
+    results = list(sliding_max_chunks(chunks, 6))
+    assert [result.tolist() for result in results] \
+        == [[], [], [50, 50, 50, 50, 50]]
+
+    # Booleans and objects, as the deque
+    b = [True, False, True, True, False, True, True, True]
+    results = list(sliding_min_chunks(
+        [numpy.array(b[0:3]), numpy.array(b[3:8])], 2))
+    assert results[0].dtype == bool
+    assert numpy.concatenate(results).tolist() == list(sliding_min(b, 2))
+    c = [2 ** 70, 5, -2 ** 70, 7, 1]
+    results = list(sliding_max_chunks(
+        [numpy.array(c[0:2], dtype=object), numpy.array(c[2:5], dtype=object)],
+        3))
+    assert numpy.concatenate(results).tolist() == list(sliding_max(c, 3))
+
+# Randomized tests
+
+import random
+
+for window in (1, 2, 3, 7, 50):
+    a = [random.randint(-1000, 1000) for i in range(500)]
+    expected_min = [min(a[i:i+window]) for i in range(len(a) - window + 1)]
+    expected_max = [max(a[i:i+window]) for i in range(len(a) - window + 1)]
+    assert list(sliding_min(a, window)) == expected_min
+    assert list(sliding_max(a, window)) == expected_max
+    if numpy is not None:
+        cuts = sorted(random.sample(range(1, len(a)), 20))
+        chunks = [numpy.array(a[i:j])
+            for i, j in zip([0] + cuts, cuts + [len(a)])]
+        assert numpy.concatenate(list(sliding_min_chunks(chunks, window))) \
+            .tolist() == expected_min
+        chunks = [chunk.astype(float) for chunk in chunks]
+        assert numpy.concatenate(list(sliding_max_chunks(chunks, window))) \
+            .tolist() == expected_max